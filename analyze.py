@@ -0,0 +1,213 @@
+# Headless batch analysis: streams FENs (one per line) from a file or stdin through a pool of warm UCI
+# engines and writes one JSON result per line. No window is opened.
+#
+#   python analyze.py positions.fen -o results.jsonl --engines 8 --depth 18
+#   python analyze.py positions.fen -o results.jsonl --resume      continue an interrupted run
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import chess
+import chess.engine
+
+import engine
+
+def read_fens(file):
+    """Yields (line number, FEN) for every line that isn't empty or a # comment"""
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+def _record(line : str):
+    """The result on an output line, None for a line cut off by an interruption or an engine error
+    (a crashed or killed engine, worth another try). Input errors such as a bad FEN are kept, they'd fail again."""
+    try:
+        result = json.loads(line)
+        result["line"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if "error" in result and not result.get("invalid"):
+        return None
+    return result
+
+def compact(path : str):
+    """Rewrites an output file before resuming: drops the records that are analysed again and a line cut off by an
+    interruption, so every input line ends up with exactly one record (see _record for what is kept)
+
+    Returns:
+        set: line numbers already analysed
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as source, open(path + ".tmp", "w") as target:
+        for line in source:
+            result = _record(line)
+            if result is not None:
+                done.add(result["line"])
+                target.write(json.dumps(result) + "\n")
+    os.replace(path + ".tmp", path)
+    return done
+
+def merge_resumed(path : str, offset : int):
+    """Merges the records a resumed run appended (from the byte offset on) into the earlier ones by line number,
+    both parts are in input order already"""
+    def records(start, end):
+        with open(path) as file:
+            file.seek(start)
+            while end is None or file.tell() < end:
+                line = file.readline()
+                if not line:
+                    return
+                try:
+                    yield json.loads(line)
+                except ValueError: # cut off by an interruption
+                    pass
+
+    with open(path + ".tmp", "w") as target:
+        for result in heapq.merge(records(0, offset), records(offset, None), key=lambda result: result["line"]):
+            target.write(json.dumps(result) + "\n")
+    os.replace(path + ".tmp", path)
+
+def analyse(pool, number : int, fen : str, limit):
+    """Analyses one position on the pool
+
+    Returns:
+        dict: line, fen, best move, score of the side to move (centipawns or mate in n), depth and principal variation,
+          or line, fen and the error ("invalid" is set when the FEN itself is the problem)
+    """
+    try:
+        chess.Board(fen)
+    except ValueError as e:
+        return {"line" : number, "fen" : fen, "error" : str(e), "invalid" : True}
+    try:
+        info = pool.analyse(fen, limit)
+        pv = info.get("pv") or []
+        score = info["score"].relative # missing when the search was stopped before reporting anything
+        return {"line" : number, "fen" : fen, "best_move" : pv[0].uci() if pv else None, "cp" : score.score(), "mate" : score.mate(),
+                "depth" : info.get("depth"), "pv" : [move.uci() for move in pv]}
+    except Exception as e:
+        return {"line" : number, "fen" : fen, "error" : str(e) or type(e).__name__}
+
+def run(fens, output, pool, limit, workers : int, ordered=True, done=frozenset()):
+    """Fans positions out to the engine pool and writes each result as a JSON line as soon as it may be written
+
+    Only a few positions per engine are read ahead, so the input can be any size.
+
+    Args:
+        fens (iterable): (line number, FEN) pairs
+        output (file): where the JSON lines go, flushed after every line
+        pool (engine.EnginePool): engines the positions are analysed on
+        limit (chess.engine.Limit): search limit per position
+        workers (int): positions analysed at once (the pool's size)
+        ordered (bool, optional): write results in input order instead of completion order. Defaults to True.
+        done (set, optional): line numbers to skip (already analysed)
+
+    Returns:
+        int: number of positions analysed
+    """
+    window = workers * 4
+    pending = {} # future -> line number
+    order = deque() # submitted line numbers not written yet, in input order
+    finished = {} # line number -> result waiting for earlier lines
+    count = 0
+    source = iter(fens)
+    exhausted = False
+
+    def write(result):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    executor = ThreadPoolExecutor(workers)
+    try:
+        while True:
+            while not exhausted and (len(order) if ordered else len(pending)) < window:
+                try:
+                    number, fen = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if number in done:
+                    continue
+                pending[executor.submit(analyse, pool, number, fen, limit)] = number
+                order.append(number)
+            if not pending:
+                break
+
+            ready, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in ready:
+                del pending[future]
+                result = future.result()
+                count += 1
+                if ordered:
+                    finished[result["line"]] = result
+                else:
+                    order.remove(result["line"])
+                    write(result)
+            while ordered and order and order[0] in finished:
+                write(finished.pop(order.popleft()))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse FENs (one per line) with a pool of UCI engines and write JSON lines")
+    parser.add_argument("input", nargs="?", help="file with one FEN per line (defaults to stdin)")
+    parser.add_argument("-o", "--output", help="JSON lines output file (defaults to stdout)")
+    parser.add_argument("--engine", default=engine.STOCKFISH_PATH, help="UCI engine executable")
+    parser.add_argument("--engines", type=int, default=os.cpu_count() or 1, help="number of engine processes")
+    parser.add_argument("--hash", type=int, help="hash table size per engine in MB")
+    parser.add_argument("--depth", type=int, help="search depth per position (defaults to 18 when no other limit is given)")
+    parser.add_argument("--movetime", type=float, help="seconds per position")
+    parser.add_argument("--nodes", type=int, help="nodes per position")
+    parser.add_argument("--order", choices=("input", "completion"), default="input", help="order of the output lines")
+    parser.add_argument("--resume", action="store_true", help="continue the output file: positions whose engine failed are analysed again, the others are skipped")
+    args = parser.parse_args(argv)
+
+    if args.resume and args.output is None:
+        parser.error("--resume needs an output file")
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        args.depth = 18
+    limit = chess.engine.Limit(depth=args.depth, time=args.movetime, nodes=args.nodes)
+
+    done = set()
+    if args.output is None:
+        output = sys.stdout
+    elif args.resume:
+        done = compact(args.output)
+        output = open(args.output, "a")
+        resumed_at = output.tell()
+    else:
+        output = open(args.output, "w")
+
+    # every engine searches single threaded, the parallelism comes from the pool
+    pool = engine.EnginePool(args.engine, size=args.engines, options={"Threads" : 1, **({"Hash" : args.hash} if args.hash else {})})
+    source = open(args.input) if args.input else sys.stdin
+    start = time.perf_counter()
+    try:
+        count = run(read_fens(source), output, pool, limit, args.engines, args.order == "input", done)
+    except KeyboardInterrupt:
+        print("interrupted, run again with --resume to continue", file=sys.stderr)
+        return 130
+    finally:
+        pool.close()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+            if args.resume and args.order == "input" and os.path.getsize(args.output) > resumed_at:
+                merge_resumed(args.output, resumed_at)
+
+    seconds = time.perf_counter() - start
+    print(f"analysed {count} positions in {seconds:.1f}s ({count / seconds if seconds else 0:.1f} positions/s)"
+          + (f", {len(done)} skipped" if done else ""), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,451 @@
+# Optional bitboard position type, a second legal move generator with the same interface as position.Position
+# (make_move/unmake_move, Zobrist key, repetition table). Every piece type of every color is a 64 bit int
+# (bit 0 = a1, bit 63 = h8). Knight, king and pawn attacks come from precomputed tables, pawns without a pin
+# move set-wise (one shift per direction for all of them) and sliding attacks use hyperbola quintessence on
+# files and diagonals (byte swapping mirrors those lines) plus a first-rank lookup table for ranks; they're only
+# computed when a slider stands on one of the square's lines. The Zobrist key uses the same numbers as
+# position.Position, so both backends give a position the same key.
+#
+#   python perft.py --backend bitboard             perft on this backend
+import movegen
+import zobrist
+from position import Position, START_FEN
+
+FULL = (1 << 64) - 1
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_CODES = "PNBRQKpnbrqk" # piece index = color * 6 + piece type
+
+# castling rights as bit flags, CASTLING_MASKS clears the rights whenever a king or rook square is touched
+CASTLE_K, CASTLE_Q, CASTLE_k, CASTLE_q = 1, 2, 4, 8
+CASTLING_FLAGS = {"K" : CASTLE_K, "Q" : CASTLE_Q, "k" : CASTLE_k, "q" : CASTLE_q}
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[0] &= ~CASTLE_Q
+CASTLING_MASKS[7] &= ~CASTLE_K
+CASTLING_MASKS[4] &= ~(CASTLE_K | CASTLE_Q)
+CASTLING_MASKS[56] &= ~CASTLE_q
+CASTLING_MASKS[63] &= ~CASTLE_k
+CASTLING_MASKS[60] &= ~(CASTLE_k | CASTLE_q)
+
+PIECE_KEYS = [zobrist.PIECE_KEYS[code] for code in PIECE_CODES] # Zobrist numbers by piece index
+CASTLING_KEYS = [zobrist.castling_key("".join(right for right, flag in CASTLING_FLAGS.items() if rights & flag)) for rights in range(16)]
+
+def _bitboard(squares):
+    bb = 0
+    for square in squares:
+        bb |= 1 << square
+    return bb
+
+def squares_of(bb):
+    """Square indices of all set bits, lowest first"""
+    squares = []
+    while bb:
+        low = bb & -bb
+        squares.append(low.bit_length() - 1)
+        bb ^= low
+    return squares
+
+BB_SQUARES = [1 << square for square in range(64)]
+FILE_A, FILE_H = _bitboard(range(0, 64, 8)), _bitboard(range(7, 64, 8))
+RANK_3, RANK_6 = _bitboard(range(16, 24)), _bitboard(range(40, 48))
+PROMOTION_RANKS = _bitboard(range(8)) | _bitboard(range(56, 64))
+KNIGHT_ATTACKS = [_bitboard(targets) for targets in movegen.KNIGHT_TARGETS]
+KING_ATTACKS = [_bitboard(targets) for targets in movegen.KING_TARGETS]
+PAWN_ATTACKS = [[_bitboard(targets) for targets in movegen.PAWN_ATTACKS["w"]],
+                [_bitboard(targets) for targets in movegen.PAWN_ATTACKS["b"]]]
+
+FILE_MASKS = [_bitboard(rays[movegen.NORTH] + rays[movegen.SOUTH]) for rays in movegen.RAYS]
+DIAGONAL_MASKS = [_bitboard(rays[movegen.NORTH_EAST] + rays[movegen.SOUTH_WEST]) for rays in movegen.RAYS]
+ANTI_DIAGONAL_MASKS = [_bitboard(rays[movegen.NORTH_WEST] + rays[movegen.SOUTH_EAST]) for rays in movegen.RAYS]
+ROOK_LINES = [_bitboard(square for direction in movegen.ORTHOGONAL for square in rays[direction]) for rays in movegen.RAYS]
+BISHOP_LINES = [_bitboard(square for direction in movegen.DIAGONAL for square in rays[direction]) for rays in movegen.RAYS]
+
+def _rank_attacks(square, inner_occupancy):
+    """Attacks along the square's rank given the occupancy of the 6 inner files"""
+    file, rank = square % 8, square // 8
+    occupied = inner_occupancy << 1
+    attacks = 0
+    for step in (1, -1):
+        target = file + step
+        while 0 <= target < 8:
+            attacks |= 1 << target
+            if occupied & (1 << target):
+                break
+            target += step
+    return attacks << (rank * 8)
+
+RANK_ATTACKS = [[_rank_attacks(square, occupancy) for occupancy in range(64)] for square in range(64)]
+
+def _between(square, other):
+    """Squares strictly between two squares on a shared line, 0 if they aren't aligned"""
+    for ray in movegen.RAYS[square]:
+        if other in ray:
+            return _bitboard(ray[:ray.index(other)])
+    return 0
+
+BETWEEN = [[_between(square, other) for other in range(64)] for square in range(64)]
+
+def _swap(bb):
+    """Mirrors a bitboard vertically (byte swap)"""
+    return int.from_bytes(bb.to_bytes(8, "big"), "little")
+
+def _line_attacks(square, occupied, mask):
+    """Hyperbola quintessence: attacks of a slider on the square along a file or diagonal mask"""
+    forward = occupied & mask
+    reverse = _swap(forward)
+    forward = (forward - 2 * BB_SQUARES[square]) & FULL
+    reverse = (reverse - 2 * BB_SQUARES[square ^ 56]) & FULL
+    return (forward ^ _swap(reverse)) & mask
+
+def rook_attacks(square, occupied):
+    return (_line_attacks(square, occupied, FILE_MASKS[square])
+            | RANK_ATTACKS[square][(occupied >> ((square & 56) + 1)) & 63])
+
+def bishop_attacks(square, occupied):
+    return (_line_attacks(square, occupied, DIAGONAL_MASKS[square])
+            | _line_attacks(square, occupied, ANTI_DIAGONAL_MASKS[square]))
+
+def queen_attacks(square, occupied):
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+class BitboardPosition():
+    """Chess position stored as bitboards, with legal move generation and make/unmake (push/pop)
+
+    Moves are movegen encoded ints (see movegen.encode_move).
+    """
+    def __init__(self, fen : str = None) -> None:
+        self.bitboards = [0] * 12
+        self.occupied = [0, 0]
+        self.mailbox = [None] * 64 # piece index per square, for O(1) lookups while making moves
+        self.turn = WHITE
+        self.castling = 0
+        self.en_passant = None
+        self.half_moves = 0
+        self.full_moves = 1
+        self.stack = [] # undo records: (move, piece, captured piece, captured square, castling, en passant, half moves, key)
+        self.key = 0 # Zobrist key, updated incrementally by push
+        self.repetitions = {} # Zobrist key -> how often the position occurred in the game so far
+        self.set_fen(fen or START_FEN)
+
+    def set_fen(self, fen : str):
+        """Loads a FEN string into the position (clears the move stack)
+
+        Raises:
+            ValueError: if the FEN is malformed (checked by position.Position, the position is left as it was)
+        """
+        parsed = Position(fen)
+        self.bitboards = [0] * 12
+        self.occupied = [0, 0]
+        self.mailbox = [None] * 64
+        self.stack = []
+        for square, code in enumerate(parsed.squares):
+            if code is not None:
+                self._put(PIECE_CODES.index(code), square)
+        self.turn = WHITE if parsed.turn == "w" else BLACK
+        self.castling = 0
+        for char in parsed.castling:
+            self.castling |= CASTLING_FLAGS.get(char, 0)
+        self.en_passant = parsed.en_passant
+        self.half_moves = parsed.half_moves
+        self.full_moves = parsed.full_moves
+        self.key = parsed.key
+        self.repetitions = {self.key : 1}
+
+    def fen(self):
+        """Generates a FEN string of the position"""
+        rows = []
+        for rank in reversed(range(8)):
+            row, empty = [], 0
+            for file in range(8):
+                piece = self.mailbox[rank * 8 + file]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row.append(str(empty))
+                    empty = 0
+                row.append(PIECE_CODES[piece])
+            if empty:
+                row.append(str(empty))
+            rows.append("".join(row))
+        castling = "".join(char for char, flag in CASTLING_FLAGS.items() if self.castling & flag) or "-"
+        en_passant = movegen.SQUARE_NAMES[self.en_passant] if self.en_passant is not None else "-"
+        return f"{'/'.join(rows)} {'wb'[self.turn]} {castling} {en_passant} {self.half_moves} {self.full_moves}"
+
+    def _put(self, piece, square):
+        self.bitboards[piece] |= BB_SQUARES[square]
+        self.occupied[piece // 6] |= BB_SQUARES[square]
+        self.mailbox[square] = piece
+
+    def _remove(self, piece, square):
+        self.bitboards[piece] ^= BB_SQUARES[square]
+        self.occupied[piece // 6] ^= BB_SQUARES[square]
+        self.mailbox[square] = None
+
+    def attackers(self, square, by, occupied):
+        """Bitboard of all pieces of side `by` attacking the square given an occupancy"""
+        bbs = self.bitboards
+        base = by * 6
+        queens = bbs[base + QUEEN]
+        found = ((KNIGHT_ATTACKS[square] & bbs[base + KNIGHT])
+                 | (KING_ATTACKS[square] & bbs[base + KING])
+                 | (PAWN_ATTACKS[by ^ 1][square] & bbs[base + PAWN]))
+        # sliding attacks are only computed when a slider stands on one of the square's lines at all
+        rooks = ROOK_LINES[square] & (bbs[base + ROOK] | queens)
+        if rooks:
+            found |= rook_attacks(square, occupied) & rooks
+        bishops = BISHOP_LINES[square] & (bbs[base + BISHOP] | queens)
+        if bishops:
+            found |= bishop_attacks(square, occupied) & bishops
+        return found
+
+    def _en_passant_key(self):
+        """En passant only counts when a pawn of the side to move could capture (the same rule as zobrist.en_passant_key)"""
+        if self.en_passant is not None and PAWN_ATTACKS[self.turn ^ 1][self.en_passant] & self.bitboards[self.turn * 6 + PAWN]:
+            return zobrist.EN_PASSANT_KEYS[self.en_passant % 8]
+        return 0
+
+    def is_repetition(self, count : int = 3):
+        """Checks whether the current position occurred at least `count` times (threefold repetition by default)"""
+        return self.repetitions.get(self.key, 0) >= count
+
+    def king_square(self, color):
+        return self.bitboards[color * 6 + KING].bit_length() - 1
+
+    def is_check(self):
+        occupied = self.occupied[0] | self.occupied[1]
+        return self.attackers(self.king_square(self.turn), self.turn ^ 1, occupied) != 0
+
+    def legal_moves(self):
+        """Generates all legal moves
+
+        Checkers and pinned pieces are computed once from the king square, so only king moves and
+        en passant captures need an individual attack test.
+
+        Returns:
+            list: movegen encoded moves
+        """
+        us, them = self.turn, self.turn ^ 1
+        bbs = self.bitboards
+        base, enemy_base = us * 6, them * 6
+        own, enemy = self.occupied[us], self.occupied[them]
+        occupied = own | enemy
+        king = bbs[base + KING].bit_length() - 1
+        moves = []
+
+        # king steps, tested against an occupancy without the king so it can't hide behind itself
+        without_king = occupied ^ BB_SQUARES[king]
+        targets = KING_ATTACKS[king] & ~own
+        while targets:
+            low = targets & -targets
+            to = low.bit_length() - 1
+            targets ^= low
+            if not self.attackers(to, them, without_king):
+                moves.append(king | to << 6)
+
+        checkers = self.attackers(king, them, occupied)
+        if checkers & (checkers - 1): # double check, only the king can move
+            return moves
+
+        if checkers:
+            evasions = BETWEEN[king][checkers.bit_length() - 1] | checkers
+        else:
+            evasions = FULL
+            self._castling_moves(king, occupied, moves)
+
+        # pinned pieces may only move along the line between king and pinner
+        pin_rays = {}
+        enemy_queens = bbs[enemy_base + QUEEN]
+        snipers = 0
+        rooks = ROOK_LINES[king] & (bbs[enemy_base + ROOK] | enemy_queens)
+        if rooks:
+            snipers |= rook_attacks(king, enemy) & rooks
+        bishops = BISHOP_LINES[king] & (bbs[enemy_base + BISHOP] | enemy_queens)
+        if bishops:
+            snipers |= bishop_attacks(king, enemy) & bishops
+        while snipers:
+            low = snipers & -snipers
+            sniper = low.bit_length() - 1
+            snipers ^= low
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pin_rays[blockers.bit_length() - 1] = BETWEEN[king][sniper] | low
+
+        targets_mask = ~own & evasions
+        for piece_type, attacks in ((KNIGHT, None), (BISHOP, bishop_attacks), (ROOK, rook_attacks), (QUEEN, queen_attacks)):
+            pieces = bbs[base + piece_type]
+            while pieces:
+                low = pieces & -pieces
+                square = low.bit_length() - 1
+                pieces ^= low
+                if attacks is None:
+                    if square in pin_rays: # a pinned knight can never move
+                        continue
+                    targets = KNIGHT_ATTACKS[square] & targets_mask
+                else:
+                    targets = attacks(square, occupied) & targets_mask
+                    if square in pin_rays:
+                        targets &= pin_rays[square]
+                while targets:
+                    low = targets & -targets
+                    moves.append(square | (low.bit_length() - 1) << 6)
+                    targets ^= low
+
+        self._pawn_moves(us, them, king, occupied, enemy, evasions, pin_rays, moves)
+        return moves
+
+    def _pawn_moves(self, us, them, king, occupied, enemy, evasions, pin_rays, moves):
+        pawns = self.bitboards[us * 6 + PAWN]
+        pinned = 0
+        for square in pin_rays:
+            pinned |= BB_SQUARES[square]
+        free = pawns & ~pinned
+        empty = ~occupied & FULL
+
+        # unpinned pawns move set-wise: one shift per direction for all of them, the origin is the target minus the shift
+        if us == WHITE:
+            single = (free << 8) & empty
+            double = ((single & RANK_3) << 8) & empty
+            steps = ((single & evasions, 8), (double & evasions, 16), (((free & ~FILE_A) << 7) & enemy & evasions, 7),
+                     (((free & ~FILE_H) << 9) & enemy & evasions, 9))
+        else:
+            single = (free >> 8) & empty
+            double = ((single & RANK_6) >> 8) & empty
+            steps = ((single & evasions, -8), (double & evasions, -16), (((free & ~FILE_H) >> 7) & enemy & evasions, -7),
+                     (((free & ~FILE_A) >> 9) & enemy & evasions, -9))
+        for targets, shift in steps:
+            while targets:
+                low = targets & -targets
+                to = low.bit_length() - 1
+                targets ^= low
+                if low & PROMOTION_RANKS:
+                    for promotion in (4, 3, 2, 1):
+                        moves.append(to - shift | to << 6 | promotion << 12)
+                else:
+                    moves.append(to - shift | to << 6)
+
+        # pinned pawns one by one, they may only move along their pin
+        step, start_rank = (8, 1) if us == WHITE else (-8, 6)
+        pinned &= pawns
+        while pinned:
+            pawn = pinned & -pinned
+            square = pawn.bit_length() - 1
+            pinned ^= pawn
+            targets = 0
+            ahead = square + step
+            if not occupied & BB_SQUARES[ahead]:
+                targets |= BB_SQUARES[ahead]
+                if square // 8 == start_rank and not occupied & BB_SQUARES[ahead + step]:
+                    targets |= BB_SQUARES[ahead + step]
+            targets |= PAWN_ATTACKS[us][square] & enemy
+            targets &= evasions & pin_rays[square]
+            while targets:
+                low = targets & -targets
+                to = low.bit_length() - 1
+                targets ^= low
+                if low & PROMOTION_RANKS:
+                    for promotion in (4, 3, 2, 1):
+                        moves.append(square | to << 6 | promotion << 12)
+                else:
+                    moves.append(square | to << 6)
+
+        # en passant changes two squares on one rank, so it gets a full attack test
+        if self.en_passant is not None:
+            capturers = PAWN_ATTACKS[them][self.en_passant] & pawns
+            captured = self.en_passant - step
+            while capturers:
+                pawn = capturers & -capturers
+                capturers ^= pawn
+                after = (occupied ^ pawn ^ BB_SQUARES[captured]) | BB_SQUARES[self.en_passant]
+                if not self.attackers(king, them, after) & ~BB_SQUARES[captured]:
+                    moves.append(pawn.bit_length() - 1 | self.en_passant << 6)
+
+    def _castling_moves(self, king, occupied, moves):
+        for right in ("K", "Q") if self.turn == WHITE else ("k", "q"):
+            if not self.castling & CASTLING_FLAGS[right]:
+                continue
+            king_from, king_to, rook_square, empty, crossed = movegen.CASTLING[right]
+            if king != king_from or self.mailbox[rook_square] != self.turn * 6 + ROOK:
+                continue
+            if any(occupied & BB_SQUARES[square] for square in empty):
+                continue
+            if any(self.attackers(square, self.turn ^ 1, occupied) for square in crossed[1:]):
+                continue
+            moves.append(king_from | king_to << 6)
+
+    def push(self, move):
+        """Makes a move, saving everything needed to take it back on the move stack. The Zobrist key is updated incrementally."""
+        from_square, to_square, promotion = move & 63, (move >> 6) & 63, move >> 12
+        piece = self.mailbox[from_square]
+        captured = self.mailbox[to_square]
+        captured_square = to_square
+        key = self.key ^ zobrist.BLACK_TO_MOVE ^ CASTLING_KEYS[self.castling]
+        if self.en_passant is not None:
+            key ^= self._en_passant_key()
+
+        kind = piece % 6
+        if kind == PAWN and to_square == self.en_passant:
+            captured_square = to_square - 8 if self.turn == WHITE else to_square + 8
+            captured = self.mailbox[captured_square]
+        self.stack.append((move, piece, captured, captured_square, self.castling, self.en_passant, self.half_moves, self.key))
+        if captured is not None:
+            self._remove(captured, captured_square)
+            key ^= PIECE_KEYS[captured][captured_square]
+
+        placed = piece - kind + promotion if promotion else piece
+        self._remove(piece, from_square)
+        self._put(placed, to_square)
+        key ^= PIECE_KEYS[piece][from_square] ^ PIECE_KEYS[placed][to_square]
+
+        if kind == KING and abs(to_square - from_square) == 2:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            rook = self.mailbox[rook_from]
+            self._remove(rook, rook_from)
+            self._put(rook, rook_to)
+            key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+
+        self.castling &= CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+        self.en_passant = (from_square + to_square) // 2 if kind == PAWN and abs(to_square - from_square) == 16 else None
+        self.half_moves = 0 if kind == PAWN or captured is not None else self.half_moves + 1
+        if self.turn == BLACK:
+            self.full_moves += 1
+        self.turn ^= 1
+        key ^= CASTLING_KEYS[self.castling]
+        if self.en_passant is not None:
+            key ^= self._en_passant_key()
+
+        self.key = key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+
+    def pop(self):
+        """Takes back the last move made with push
+
+        Returns:
+            int: the move that was taken back
+        """
+        count = self.repetitions[self.key] - 1
+        if count:
+            self.repetitions[self.key] = count
+        else:
+            del self.repetitions[self.key]
+        move, piece, captured, captured_square, self.castling, self.en_passant, self.half_moves, self.key = self.stack.pop()
+        from_square, to_square = move & 63, (move >> 6) & 63
+        self.turn ^= 1
+        if self.turn == BLACK:
+            self.full_moves -= 1
+
+        if piece % 6 == KING and abs(to_square - from_square) == 2:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            rook = self.mailbox[rook_to]
+            self._remove(rook, rook_to)
+            self._put(rook, rook_from)
+
+        self._remove(self.mailbox[to_square], to_square)
+        self._put(piece, from_square)
+        if captured is not None:
+            self._put(captured, captured_square)
+        return move
+
+    # same make/unmake names as position.Position, so both backends can be driven by the same code
+    make_move = push
+    unmake_move = pop
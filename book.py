@@ -0,0 +1,117 @@
+# Polyglot opening books. The .bin file is memory mapped and searched by the position's Polyglot Zobrist key
+# (python-chess's polyglot reader, a binary search over the sorted 16 byte entries), so a book reply costs
+# microseconds and no engine call. Nothing is opened until the first lookup.
+#
+#   python book.py book.bin                        moves of the start position with their weights
+#   python book.py book.bin --fen "<fen>"          moves of another position
+import os
+import random
+import sys
+import threading
+
+import movegen
+from position import Position, START_FEN
+
+BOOK_PATH = "books/book.bin"
+
+class OpeningBook():
+    """A Polyglot book, opened on first use
+
+    Args:
+        path (str, optional): the .bin file. Defaults to BOOK_PATH.
+        minimum_weight (int, optional): entries below this weight are never played. Defaults to 1.
+        rng (random.Random, optional): source of the weighted choices. Defaults to the random module.
+    """
+    def __init__(self, path=BOOK_PATH, minimum_weight=1, rng=None) -> None:
+        self.path = path
+        self.minimum_weight = minimum_weight
+        self.rng = rng or random
+        self._reader = None
+        self._lock = threading.Lock()
+
+    @property
+    def reader(self):
+        """The memory mapped python-chess reader"""
+        if self._reader is None:
+            import chess.polyglot
+
+            with self._lock:
+                if self._reader is None:
+                    self._reader = chess.polyglot.open_reader(self.path)
+        return self._reader
+
+    def entries(self, fen : str):
+        """Book moves of a position
+
+        Args:
+            fen (str): FEN string of the position
+
+        Returns:
+            list: (movegen encoded move, weight) pairs, legal moves only, heaviest first
+        """
+        import chess
+
+        board = chess.Board(fen)
+        position = Position(fen)
+        found = []
+        for entry in self.reader.find_all(board, minimum_weight=self.minimum_weight):
+            move = movegen.uci_to_move(entry.move.uci()) # python-chess already turned king takes rook into castling
+            if move in position.legal_moves(movegen.move_from(move)): # a key collision can suggest nonsense
+                found.append((move, entry.weight))
+        return sorted(found, key=lambda entry: entry[1], reverse=True)
+
+    def choose(self, fen : str, best=False):
+        """Picks a book move, more often the heavier ones
+
+        Args:
+            fen (str): FEN string of the position
+            best (bool, optional): always play the heaviest move instead. Defaults to False.
+
+        Returns:
+            int or None: movegen encoded move, None when the position isn't in the book
+        """
+        found = self.entries(fen)
+        if not found:
+            return None
+        if best:
+            return found[0][0]
+        return self.rng.choices([move for move, _ in found], weights=[weight for _, weight in found])[0]
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+_book = None
+_book_lock = threading.Lock()
+
+def get_book(path=None):
+    """The process-wide opening book, None if there's no book file. Passing a path on first use picks the file."""
+    global _book
+    with _book_lock:
+        if _book is None:
+            path = path or BOOK_PATH
+            _book = OpeningBook(path) if os.path.exists(path) else False
+        return _book or None
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List the book moves of a position")
+    parser.add_argument("book", help="Polyglot .bin file")
+    parser.add_argument("--fen", default=START_FEN)
+    args = parser.parse_args(argv)
+
+    opening_book = OpeningBook(args.book)
+    found = opening_book.entries(args.fen)
+    total = sum(weight for _, weight in found)
+    for move, weight in found:
+        print(f"{movegen.move_to_uci(move):6} {weight:6} {weight / total:6.1%}")
+    if not found:
+        print("not in book")
+    opening_book.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
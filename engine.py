@@ -0,0 +1,359 @@
+# Long-lived UCI engine processes. Spawning Stockfish and doing the UCI handshake costs far more than a
+# shallow search, so engines are started once, reused between positions and only restarted when they die.
+# python-chess (chess.engine pulls in asyncio) is imported where it's first used, importing this module is cheap.
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+STOCKFISH_PATH = "stockfish/stockfish-windows-x86-64-modern.exe"
+
+class EnginePool():
+    """A pool of warm UCI engine processes
+
+    Args:
+        command (str or list, optional): engine executable (and arguments). Defaults to the bundled Stockfish path.
+        size (int, optional): maximum number of engine processes. Defaults to 1.
+        options (dict, optional): UCI options configured on every engine after it starts (Threads, Hash, ...)
+        health_check (bool, optional): ping an idle engine before handing it out. Defaults to True.
+    """
+    def __init__(self, command=STOCKFISH_PATH, size=1, options=None, health_check=True) -> None:
+        self.command = command if isinstance(command, list) else [command]
+        self.size = size
+        self.options = options or {}
+        self.health_check = health_check
+        self.game = object() # a new game key makes python-chess send ucinewgame on the next search
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _spawn(self):
+        import chess.engine
+
+        engine = chess.engine.SimpleEngine.popen_uci(self.command)
+        if self.options:
+            engine.configure(self.options)
+        return engine
+
+    def _discard(self, engine):
+        """Closes a broken engine and frees its slot so a fresh one can be started"""
+        try:
+            engine.quit()
+        except Exception:
+            try:
+                engine.close()
+            except Exception:
+                pass
+        with self._lock:
+            self._started -= 1
+
+    def _acquire(self):
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                spawn = self._started < self.size
+                if spawn:
+                    self._started += 1
+            if not spawn:
+                engine = self._idle.get()
+            else:
+                try:
+                    return self._spawn()
+                except Exception:
+                    with self._lock:
+                        self._started -= 1
+                    raise
+
+        if self.health_check:
+            try:
+                engine.ping()
+            except Exception:
+                # the process crashed or hung while idle, replace it
+                self._discard(engine)
+                return self._acquire()
+        return engine
+
+    @contextmanager
+    def engine(self):
+        """Borrows an engine from the pool (starting one if none is idle and the pool isn't full)
+
+        Yields:
+            chess.engine.SimpleEngine: an engine that is returned to the pool afterwards
+        """
+        import chess.engine
+
+        engine = self._acquire()
+        try:
+            yield engine
+        except chess.engine.EngineTerminatedError:
+            self._discard(engine)
+            raise
+        except BaseException:
+            self._idle.put(engine)
+            raise
+        else:
+            if self._closed:
+                self._discard(engine)
+            else:
+                self._idle.put(engine)
+
+    def new_game(self):
+        """Makes the next search on every engine start with ucinewgame (clears hash tables)"""
+        self.game = object()
+
+    def analyse(self, fen : str, limit, retries=1, **kwargs):
+        """Analyses a position on a pooled engine, restarting the engine if it crashes mid-search
+
+        Args:
+            fen (str): FEN string of the position
+            limit (chess.engine.Limit): search limit
+            retries (int, optional): how often a search is retried on a fresh engine after a crash. Defaults to 1.
+
+        Returns:
+            chess.engine.InfoDict: the analysis info
+        """
+        import chess.engine
+
+        board = chess.Board(fen=fen)
+        while True:
+            try:
+                with self.engine() as engine:
+                    return engine.analyse(board, limit, game=self.game, **kwargs)
+            except chess.engine.EngineTerminatedError:
+                if retries <= 0:
+                    raise
+                retries -= 1
+
+    def close(self):
+        """Quits every idle engine, engines still in use are closed when they are returned"""
+        self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(engine)
+
+class EvalCache():
+    """Bounded LRU cache of engine results keyed by position (FEN without the move counters)
+
+    A result searched to some depth also answers every request for a shallower depth.
+
+    Args:
+        max_entries (int, optional): number of positions kept before the least recently used is evicted. Defaults to 100000.
+        max_bytes (int, optional): rough memory limit for the cached entries, None for no limit. Defaults to None.
+        path (str, optional): JSON file the cache is loaded from and saved to between sessions. Defaults to None.
+    """
+    ENTRY_OVERHEAD = 200 # approximate bytes per entry besides the key (tuple, move object, dict slot)
+
+    def __init__(self, max_entries=100000, max_bytes=None, path=None) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = self.misses = 0
+        self._entries = OrderedDict() # key -> (depth, best move, evaluation)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def key(fen : str):
+        """Normalized position key: placement, side to move, castling and en passant (move counters dropped)"""
+        return " ".join(fen.split()[:4])
+
+    def _size(self, key):
+        return sys.getsizeof(key) + self.ENTRY_OVERHEAD
+
+    def get(self, fen : str, depth : int):
+        """Returns (best move, evaluation) searched to at least the given depth, or None"""
+        key = self.key(fen)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < depth:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, fen : str, depth : int, best_move, evaluation):
+        """Stores a result unless a deeper one for the same position is already cached"""
+        key = self.key(fen)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > depth:
+                    return
+            else:
+                self._bytes += self._size(key)
+            self._entries[key] = (depth, best_move, evaluation)
+            self._entries.move_to_end(key)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def put_info(self, fen : str, info):
+        """Stores a finished search's result (see summarize). A search that reported no depth or principal variation,
+        e.g. one stopped before its first iteration, isn't stored: it would pass for a full depth result."""
+        if "depth" not in info or not info.get("pv"):
+            return
+        self.put(fen, info["depth"], *summarize(info))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def save(self, path=None):
+        """Writes the cache to a JSON file (moves are stored in UCI notation)"""
+        path = path or self.path
+        with self._lock:
+            data = {key : [depth, str(best_move) if best_move is not None else None, evaluation]
+                    for key, (depth, best_move, evaluation) in self._entries.items()}
+        with open(path, "w") as file:
+            json.dump(data, file)
+
+    def load(self, path=None):
+        """Reads a cache file written by save, oldest entries first so the LRU order survives"""
+        import chess
+
+        with open(path or self.path) as file:
+            data = json.load(file)
+        for key, (depth, best_move, evaluation) in data.items():
+            self.put(key, depth, chess.Move.from_uci(best_move) if best_move else None, evaluation)
+
+def summarize(info):
+    """Reduces an analysis info dict to (best move, evaluation from the side to move's view): the evaluation is
+    in pawns, "#N" for a mate in N ("#-N" when getting mated) and "?" when the search reported no score.
+    The best move is None only when the search reported no principal variation."""
+    pv = info.get("pv")
+    best_move = pv[0] if pv else None
+    score = info.get("score")
+    if score is None:
+        return best_move, "?"
+    mate = score.relative.mate()
+    evaluation = f"#{mate}" if mate is not None else score.relative.score() / 100
+    return best_move, evaluation
+
+class BackgroundAnalyzer():
+    """Runs engine searches on a worker thread so the render loop never waits for them
+
+    Results are posted to a queue tagged with the FEN they belong to. Submitting a new position
+    stops the search in flight and drops requests that were superseded while waiting.
+
+    Args:
+        pool (EnginePool, optional): pool the searches run on. Defaults to the process-wide pool.
+    """
+    def __init__(self, pool=None, cache=None) -> None:
+        self.pool = pool or get_pool()
+        self.cache = cache
+        self.results = queue.Queue()
+        self._requests = queue.Queue()
+        self._latest = None # the only request whose result is still wanted
+        self._running = None # analysis handle of the search in flight
+        self._stopped = False # whether the search in flight was stopped early, its result is incomplete
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def submit(self, fen : str, depth : int):
+        """Requests an analysis, superseding every earlier request"""
+        request = (fen, depth)
+        with self._lock:
+            self._latest = request
+            if self._running is not None and self._running[0] != request:
+                self._running[1].stop()
+                self._stopped = True
+        cached = self.cache.get(fen, depth) if self.cache is not None else None
+        if cached is not None:
+            self.results.put((fen, cached))
+            return
+        self._requests.put(request)
+
+    def poll(self):
+        """Returns every finished result as a list of (fen, (best move, evaluation)) without blocking"""
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    def _work(self):
+        while True:
+            request = self._requests.get()
+            if request != self._latest:
+                continue
+            try:
+                info, stopped = self._analyse(request)
+                result = summarize(info)
+                if self.cache is not None and not stopped:
+                    self.cache.put_info(request[0], info)
+            except Exception as e:
+                result = None, str(e)
+            if request == self._latest:
+                self.results.put((request[0], result))
+
+    def _analyse(self, request):
+        import chess.engine
+
+        fen, depth = request
+        board = chess.Board(fen=fen)
+        with self.pool.engine() as engine:
+            with engine.analysis(board, chess.engine.Limit(depth=depth), game=self.pool.game) as analysis:
+                with self._lock:
+                    self._running = (request, analysis)
+                    self._stopped = request != self._latest
+                    if self._stopped: # superseded before the handle was published
+                        analysis.stop()
+                try:
+                    analysis.wait()
+                finally:
+                    with self._lock:
+                        self._running = None
+                        stopped = self._stopped
+                return analysis.info, stopped
+
+_pool = None
+_analyzer = None
+_cache = None
+_pool_lock = threading.Lock()
+
+def get_pool(command=STOCKFISH_PATH, size=1):
+    """The process-wide engine pool, created on first use and closed at interpreter exit"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EnginePool(command, size)
+            atexit.register(_pool.close)
+        return _pool
+
+def get_analyzer():
+    """The process-wide background analyzer, running on the shared engine pool"""
+    global _analyzer
+    pool, cache = get_pool(), get_cache()
+    with _pool_lock:
+        if _analyzer is None:
+            _analyzer = BackgroundAnalyzer(pool, cache)
+        return _analyzer
+
+def get_cache(path=None):
+    """The process-wide evaluation cache. Passing a path on first use persists it to that file at exit."""
+    global _cache
+    with _pool_lock:
+        if _cache is None:
+            _cache = EvalCache(path=path)
+            if path is not None:
+                atexit.register(_cache.save)
+        return _cache
@@ -0,0 +1,108 @@
+# Compact game records: moves are kept as 16 bit movegen ints and a FEN snapshot is stored every few plies,
+# any position of the game is rebuilt from the nearest snapshot by replaying the moves after it.
+from array import array
+
+from position import Position, START_FEN
+
+class GameHistory():
+    """A game line stored as encoded moves plus periodic snapshots
+
+    Histories are append only. Playing a different move from an earlier position forks a new history that
+    shares the moves before the fork with its parent instead of copying them.
+
+    Args:
+        fen (str, optional): position the game starts from. Defaults to the start position.
+        snapshot_interval (int, optional): a snapshot is stored every this many plies. Defaults to 32.
+    """
+    def __init__(self, fen : str = None, snapshot_interval : int = 32) -> None:
+        self.snapshot_interval = snapshot_interval
+        self.parent = None
+        self.base = 0 # number of moves shared with the parent
+        self.moves = array("H") # the moves after base
+        self.snapshots = {0 : fen or START_FEN} # ply -> FEN, only plies after base (except the root's ply 0)
+
+    def __len__(self):
+        """Number of moves in the line"""
+        return self.base + len(self.moves)
+
+    def __iter__(self):
+        return self.line(0, len(self))
+
+    def _owner(self, ply : int):
+        """The history in the fork chain that stores the given ply"""
+        history = self
+        while history.parent is not None and ply <= history.base:
+            history = history.parent
+        return history
+
+    def move(self, ply : int):
+        """The move played from the position after `ply` moves
+
+        Raises:
+            IndexError: if the line has no such move
+        """
+        if not 0 <= ply < len(self):
+            raise IndexError(f"no move at ply {ply}")
+        history = self._owner(ply + 1) # the move leading to ply + 1 is stored by whoever stores that ply
+        return history.moves[ply - history.base]
+
+    def line(self, start : int, stop : int):
+        """Yields the moves played between two plies"""
+        for ply in range(start, stop):
+            yield self.move(ply)
+
+    def append(self, move : int, fen : str = None):
+        """Adds a move to the end of the line
+
+        Args:
+            move (int): movegen encoded move
+            fen (str, optional): FEN after the move, saves a replay when a snapshot is due
+        """
+        self.moves.append(move)
+        ply = len(self)
+        if ply % self.snapshot_interval == 0:
+            if fen is None:
+                position = self.position(ply - 1)
+                position.make_move(move)
+                fen = position.fen()
+            self.snapshots[ply] = fen
+
+    def snapshot(self, ply : int):
+        """The snapshot closest before (or at) a ply
+
+        Returns:
+            tuple: (snapshot ply, FEN)
+        """
+        if not 0 <= ply <= len(self):
+            raise IndexError(f"no position at ply {ply}")
+        start = ply - ply % self.snapshot_interval
+        return start, self._owner(start).snapshots[start]
+
+    def position(self, ply : int):
+        """Rebuilds the position after `ply` moves from the nearest snapshot
+
+        Returns:
+            position.Position: a new position whose undo stack starts at the snapshot
+        """
+        start, fen = self.snapshot(ply)
+        position = Position(fen)
+        for move in self.line(start, ply):
+            position.make_move(move)
+        return position
+
+    def fen(self, ply : int):
+        return self.position(ply).fen()
+
+    def fork(self, ply : int):
+        """A new history sharing the first `ply` moves with this one, nothing is copied
+
+        Returns:
+            GameHistory: an empty continuation after `ply` moves
+        """
+        if not 0 <= ply <= len(self):
+            raise IndexError(f"no position at ply {ply}")
+        forked = GameHistory(snapshot_interval=self.snapshot_interval)
+        forked.parent = self._owner(ply)
+        forked.base = ply
+        forked.snapshots = {}
+        return forked
@@ -1,36 +1,46 @@
 from setup import *
 import pyperclip
+import render
+import engine
+import pgn
+import book
+import tablebase
 import os
+import functools
 
 class Game():
     """Game class which houses all window functions and game loop
     """
-    def __init__(self, fen : str, play_as : str, ai: bool, depth=10) -> None:
+    def __init__(self, fen : str, play_as : str, ai: bool, depth=10, eval_cache=None, dirty_rendering=True, opening_book=None, tablebases=None) -> None:
         """Initialization of the game
 
         Args:
             fen (str): FEN string to generate the game position
             play_as (str): "w" or "b" determines which side the human/main player plays on
-            ai (bool): True if players wants to play vs AI else False
+            ai (bool or type): True if players wants to play vs AI (Stockfish) else False, or the Player class of the AI
             depth (int, optional): AI Move calculation depth. Defaults to 10.
+            eval_cache (str, optional): file that keeps engine evaluations between sessions. Defaults to None (memory only).
+            dirty_rendering (bool, optional): redraw only the regions that changed each frame instead of the whole window. Defaults to True.
+            opening_book (str, optional): Polyglot book the AI plays from while the position is in it. Defaults to book.BOOK_PATH (if it exists).
+            tablebases (str, optional): directory of Syzygy tables the AI and the evaluation use in endgames they cover. Defaults to tablebase.TABLEBASE_PATH (if it exists).
         """
+        engine.get_cache(eval_cache)
+        book.get_book(opening_book)
+        tablebase.get_tablebases(tablebases)
         pg.init()
         self.display = pg.display.set_mode((800 * 1.7, 800 * 1.2))
         self.clock = pg.time.Clock()
 
         pg.display.set_caption("Chess")
-        pg.display.set_icon(pg.transform.rotozoom(
-            pg.image.load("Pieces/White/knight.png").convert_alpha(), 0, 0.2))
+        pg.display.set_icon(pg.transform.rotozoom(render.atlas.source("White", "knight"), 0, 0.2))
         
-        self.font = pg.font.Font("pieces/Philosopher-Regular.ttf", 30)
+        self.font = render.text_cache.font("pieces/Philosopher-Regular.ttf", 30)
         self.board = Board(fen, play_as, ai, depth) # initializing the game
         self.ai = ai
+        self.renderer = render.DirtyRenderer() if dirty_rendering else None
 
-        if play_as == "b":
-            self.board.flip_board()
-
-    def update(self):
-        pg.display.update()
+    def update(self, rects=None):
+        pg.display.update(rects) if rects is not None else pg.display.update()
         self.clock.tick(60)
         #pg.display.set_caption(str(round(self.clock.get_fps(),2))) # Test for lag
 
@@ -55,6 +65,9 @@ class Game():
                 
                 if pg.key.get_pressed()[pg.K_LCTRL] & pg.key.get_pressed()[pg.K_EQUALS] & self.board.running: 
                     self.resize_window(10)         
+
+                if pg.key.get_pressed()[pg.K_LCTRL] & pg.key.get_pressed()[pg.K_s]:
+                    self.save_game()
     
     def resize_window(self, increment : int):
         """Resizing the window by an increment each time a certain keydown event occurs
@@ -68,14 +81,21 @@ class Game():
         if self.board.tile_size + increment <= 0:
             return False
         
-        temp = self.board
-        
-        self.board = Board(self.board.current_fen, play_as=temp.player_1.color, ai=ai, depth=temp.ai_depth, tile_size=temp.tile_size + increment)
-        self.board.game_positions = temp.game_positions
-        self.board.game_position_index = temp.game_position_index
+        self.board.set_tile_size(self.board.tile_size + increment)
         self.display = pg.display.set_mode((self.board.GAME_SURFACE_SIZE * 1.7, self.board.GAME_SURFACE_SIZE * 1.2))
-        self.font = pg.font.Font("pieces/Philosopher-Regular.ttf", int(30 * (self.board.tile_size/100)))
+        render.text_cache.clear()
+        self.font = render.text_cache.font("pieces/Philosopher-Regular.ttf", int(30 * (self.board.tile_size/100)))
     
+    def save_game(self, path="games.pgn"):
+        """Appends the game played so far to a PGN file
+
+        Args:
+            path (str, optional): the PGN file. Defaults to "games.pgn".
+        """
+        with open(path, "a") as file:
+            pgn.export(self.board, file)
+        print(f"game saved to {path}")
+
     def traverse_positions(self, increment : int):
         """Traverse throughout all positions played in game so far.
 
@@ -85,77 +105,101 @@ class Game():
         Returns:
            False if the move index doesn't exist
         """
-        if self.board.game_position_index + increment > -1:
+        if not self.board.goto_ply(self.board.ply + increment):
             return False
-        if self.board.game_position_index + increment < len(self.board.game_positions) * -1:
-            return False 
-        self.board.game_position_index += increment  
-        
-        self.board.reset_board()
-        self.board.load_fen(self.board.game_positions[self.board.game_position_index], self.board.player_1.color, self.ai)
-        self.board.current_fen = self.board.gen_fen()
-        self.board.position_analysis = self.board.analyze_position(self.board.current_fen, self.board.ai_depth)[1]
+        self.board.request_analysis()
     
     def display_fen(self):
-        """Displays the FEN string of the current position
+        """FEN string of the current position
+
+        Returns:
+            tuple: (key, text surface, rect) overlay
         """
-        text = self.font.render(f"FEN(click to copy): {self.board.current_fen}", True, "white")
+        message = f"FEN(click to copy): {self.board.current_fen}"
+        text = self.font.render(message, True, "white")
         rect = text.get_rect(center = (self.display.get_width() / 2, (self.display.get_height() -(50 * (self.board.tile_size/100)))))
-        self.display.blit(text, rect)    
         if rect.collidepoint(pg.mouse.get_pos()):
             if pg.mouse.get_pressed()[0]:
                 pyperclip.copy(self.board.current_fen)   
+        return ("fen", message), text, rect
 
     def display_eval(self):
-        """Displays Stockfish's evaluation of the current position"""
-        text = self.font.render(f"Stockfish eval: {self.board.position_analysis}", True, "white")
+        """Stockfish's evaluation of the current position
+
+        Returns:
+            tuple: (key, text surface, rect) overlay
+        """
+        message = f"Stockfish eval: {self.board.position_analysis}"
+        text = self.font.render(message, True, "white")
         rect = text.get_rect(center = ((self.display.get_width() -(140 * (self.board.tile_size/100))), self.display.get_height() / 2))
-        self.display.blit(text, rect)    
         if rect.collidepoint(pg.mouse.get_pos()):
             if pg.mouse.get_pressed()[0]:
                 pyperclip.copy(self.board.current_fen)             
+        return ("eval", message), text, rect
 
     def game_over_message(self):
-        """Display the game_over state once the game has concluded (checkmate or stalemate)
+        """The game_over state once the game has concluded (checkmate, stalemate or threefold repetition)
+
+        Returns:
+            tuple: (key, text surface, rect) overlay
         """
-        if self.board.game_over(self.board.current_fen) == 1:
+        result = self.board.game_over(self.board.current_fen)
+        if result == 1:
             if self.board.to_move == "w":
                 text = self.font.render(f"Checkmate. White wins.", True, "White")
             else:
                 text = self.font.render(f"Checkmate. White wins.", True, "White")    
+        elif result == 2:
+            text = self.font.render("Draw by threefold repetition.", True, "White")
         else:
             text = self.font.render(f"Stalemate.", True, "White")   
 
         rect = text.get_rect(center=(self.display.get_width() / 2, self.display.get_height() - ((self.display.get_height() - 40 * (self.board.tile_size/100)))))    
-        self.display.blit(text, rect)            
+        return ("result", result), text, rect
+
+    def sprites(self):
+        """Every piece sprite in drawing order (the main player's pieces on top)"""
+        if self.board.player_1.color == "b":
+            return self.board.pieces["white"].sprites() + self.board.pieces["black"].sprites()
+        return self.board.pieces["black"].sprites() + self.board.pieces["white"].sprites()
     
     def __call__(self):
         """Game loop
         """
         while True:
-            self.display.fill("#161512")
             self.check_events()
-            
-            self.board.display_board(self.display)
-            if self.board.player_1.color == "b":
-                self.board.pieces["white"].draw(self.display)
-                self.board.pieces["black"].draw(self.display) 
-            else:
-                self.board.pieces["black"].draw(self.display)
-                self.board.pieces["white"].draw(self.display)  
+            self.board.poll_analysis()
             self.board.pieces["black"].update()
             self.board.pieces["white"].update()    
             
+            overlays = []
             if self.board.running:  
-                self.board.player_1.move(self.display)
-                self.board.player_2.move() if self.ai else self.board.player_2.move(self.display)
+                self.board.player_1.move()
+                self.board.player_2.move()
+                for player in (self.board.player_1, self.board.player_2):
+                    for square in player.highlights():
+                        marker = self.board.view.rect(square).scale_by(0.4, 0.4)
+                        overlays.append((("move", tuple(marker)), render.move_marker(marker), marker))
             else:
-                self.game_over_message()
+                overlays.append(self.game_over_message())
             
             if os.path.exists("./stockfish") and os.path.isdir("./stockfish"):
-                self.display_eval()
+                overlays.append(self.display_eval())
             
-            self.display_fen()  
+            overlays.append(self.display_fen())
+            self.board.place_sprites()
+            sprites = self.sprites()
+            if self.renderer is not None:
+                self.update(self.renderer.draw(self.display, self.board, sprites, overlays))
+                continue
+
+            # full redraw
+            self.display.fill("#161512")
+            self.board.display_board(self.display)
+            for sprite in sprites:
+                self.display.blit(sprite.image, sprite.rect)
+            for _, surface, rect in overlays:
+                self.display.blit(surface, rect)
             self.update()
 
 if __name__ == "__main__":
@@ -171,8 +215,10 @@ if __name__ == "__main__":
     
     ai = input("Play vs AI? [y/n]: ")
     ai = True if ai.lower() == "y" else False
+    if ai and input("Use Stockfish or the built-in engine? [s/b] (defaults to Stockfish): ").lower() == "b":
+        ai = functools.partial(SearchAI, workers=os.cpu_count() or 1) # parallel search on every core
     
-    difficulty = input("choose a difficulty to play against (easy, moderate, hard): ") if ai == True else 10
+    difficulty = input("choose a difficulty to play against (easy, moderate, hard): ") if ai else 10
     if difficulty != 10:
         if difficulty.lower() not in ["easy", "moderate", "hard"]:
             difficulty = 10
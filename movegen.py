@@ -0,0 +1,279 @@
+# Square-index move generation. Squares are numbered 0 (a1) to 63 (h8) and a position is a 64 entry
+# mailbox holding FEN piece codes ("P", "n", ...) or None for empty squares.
+# All ray and leaper tables are built once at import time, nothing here depends on pixels or pygame.
+
+FILES = "abcdefgh"
+SQUARE_NAMES = [f"{FILES[square % 8]}{square // 8 + 1}" for square in range(64)]
+SQUARE_INDEX = {name: square for square, name in enumerate(SQUARE_NAMES)}
+
+# ray directions as (file step, rank step), RAYS[square][direction] follows this order
+EAST, WEST, NORTH, SOUTH, NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST = range(8)
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1))
+
+HORIZONTAL = (EAST, WEST)
+VERTICAL = (NORTH, SOUTH)
+ORTHOGONAL = HORIZONTAL + VERTICAL
+DIAGONAL = (NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST)
+ALL_DIRECTIONS = ORTHOGONAL + DIAGONAL
+
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+
+def _on_board(file, rank):
+    return 0 <= file < 8 and 0 <= rank < 8
+
+def _ray(square, file_step, rank_step):
+    """All squares from (not including) square towards the edge of the board"""
+    ray = []
+    file, rank = square % 8 + file_step, square // 8 + rank_step
+    while _on_board(file, rank):
+        ray.append(rank * 8 + file)
+        file += file_step
+        rank += rank_step
+    return tuple(ray)
+
+def _leaps(square, steps):
+    """All squares a single step away from square for each of the given steps"""
+    file, rank = square % 8, square // 8
+    return tuple((rank + dr) * 8 + file + df for df, dr in steps if _on_board(file + df, rank + dr))
+
+RAYS = [tuple(_ray(square, *direction) for direction in DIRECTIONS) for square in range(64)]
+KNIGHT_TARGETS = [_leaps(square, KNIGHT_STEPS) for square in range(64)]
+KING_TARGETS = [_leaps(square, DIRECTIONS) for square in range(64)]
+# squares attacked by a pawn of the given color standing on the square
+PAWN_ATTACKS = {"w" : [_leaps(square, ((1, 1), (-1, 1))) for square in range(64)],
+                "b" : [_leaps(square, ((1, -1), (-1, -1))) for square in range(64)]}
+
+# castling right -> (king from, king to, rook square, squares that must be empty, squares the king crosses)
+CASTLING = {
+    "K" : (4, 6, 7, (5, 6), (4, 5, 6)),
+    "Q" : (4, 2, 0, (1, 2, 3), (4, 3, 2)),
+    "k" : (60, 62, 63, (61, 62), (60, 61, 62)),
+    "q" : (60, 58, 56, (57, 58, 59), (60, 59, 58)),
+}
+
+def color_of(code):
+    """The side ("w" or "b") a piece code belongs to"""
+    return "w" if code.isupper() else "b"
+
+def is_attacked(squares, square, by):
+    """Checks whether a square is attacked by any piece of the given side
+
+    Args:
+        squares (list): 64 entry mailbox of piece codes
+        square (int): index of the square to test
+        by (str): "w" or "b", the attacking side
+
+    Returns:
+        bool: True if at least one piece of the side attacks the square
+    """
+    if by == "w":
+        knight, king, pawn, rook, bishop, queen = "NKPRBQ"
+        pawn_sources = PAWN_ATTACKS["b"][square]
+    else:
+        knight, king, pawn, rook, bishop, queen = "nkprbq"
+        pawn_sources = PAWN_ATTACKS["w"][square]
+
+    for target in KNIGHT_TARGETS[square]:
+        if squares[target] == knight:
+            return True
+    for target in pawn_sources:
+        if squares[target] == pawn:
+            return True
+    for target in KING_TARGETS[square]:
+        if squares[target] == king:
+            return True
+
+    rays = RAYS[square]
+    for direction in ORTHOGONAL:
+        for target in rays[direction]:
+            code = squares[target]
+            if code is not None:
+                if code == rook or code == queen:
+                    return True
+                break
+    for direction in DIAGONAL:
+        for target in rays[direction]:
+            code = squares[target]
+            if code is not None:
+                if code == bishop or code == queen:
+                    return True
+                break
+    return False
+
+def check_info(squares, king, color):
+    """Finds the pieces checking a king and the pieces pinned against it, scanning once from the king's square
+
+    Args:
+        squares (list): 64 entry mailbox of piece codes
+        king (int): index of the king's square
+        color (str): "w" or "b", the side the king belongs to
+
+    Returns:
+        tuple: list of checking squares, set of squares that capture or block a single check (None when not in check)
+          and a dict mapping every pinned square to the set of squares it may still move to
+    """
+    white = color == "w"
+    knight, pawn, rook, bishop, queen = "nprbq" if white else "NPRBQ"
+    checkers = []
+    evasions = set()
+    pins = {}
+
+    for target in KNIGHT_TARGETS[king]:
+        if squares[target] == knight:
+            checkers.append(target)
+            evasions.add(target)
+    for target in PAWN_ATTACKS[color][king]:
+        if squares[target] == pawn:
+            checkers.append(target)
+            evasions.add(target)
+
+    rays = RAYS[king]
+    for direction in ALL_DIRECTIONS:
+        sliders = (rook, queen) if direction in ORTHOGONAL else (bishop, queen)
+        line = []
+        pinned = None
+        for target in rays[direction]:
+            line.append(target)
+            code = squares[target]
+            if code is None:
+                continue
+            if code.isupper() == white:
+                if pinned is not None:
+                    break
+                pinned = target
+                continue
+            if code in sliders:
+                if pinned is None:
+                    checkers.append(target)
+                    evasions.update(line)
+                else:
+                    pins[pinned] = set(line)
+            break
+    return checkers, evasions if checkers else None, pins
+
+def slider_targets(squares, square, directions):
+    """Squares a sliding piece can reach along the given directions (stops at the first blocker, captures enemies)"""
+    white = squares[square].isupper()
+    targets = []
+    rays = RAYS[square]
+    for direction in directions:
+        for target in rays[direction]:
+            code = squares[target]
+            if code is None:
+                targets.append(target)
+                continue
+            if code.isupper() != white:
+                targets.append(target)
+            break
+    return targets
+
+def leaper_targets(squares, square, table):
+    """Squares a knight or king can step to from a precomputed target table"""
+    white = squares[square].isupper()
+    return [target for target in table[square] if squares[target] is None or squares[target].isupper() != white]
+
+def pawn_targets(squares, square, en_passant=None):
+    """Pawn advances (single and double), captures and en passant captures
+
+    Args:
+        squares (list): 64 entry mailbox of piece codes
+        square (int): index of the pawn's square
+        en_passant (int, optional): index of the en passant target square. Defaults to None.
+    """
+    white = squares[square].isupper()
+    step, start_rank, color = (8, 1, "w") if white else (-8, 6, "b")
+    targets = []
+
+    ahead = square + step
+    if 0 <= ahead < 64 and squares[ahead] is None:
+        targets.append(ahead)
+        if square // 8 == start_rank and squares[ahead + step] is None:
+            targets.append(ahead + step)
+
+    for target in PAWN_ATTACKS[color][square]:
+        code = squares[target]
+        if code is not None:
+            if code.isupper() != white:
+                targets.append(target)
+        elif target == en_passant:
+            targets.append(target)
+    return targets
+
+def castling_targets(squares, square, castling):
+    """King destinations of every castle still allowed by the castling rights
+
+    The rook must stand on its corner, the squares between must be empty and the king may
+    neither be in check nor cross or land on an attacked square.
+    """
+    targets = []
+    if castling in ("-", ""):
+        return targets
+    code = squares[square]
+    color = color_of(code)
+    enemy = "b" if color == "w" else "w"
+    rook = "R" if color == "w" else "r"
+    for right in ("K", "Q") if color == "w" else ("k", "q"):
+        if right not in castling:
+            continue
+        king_from, king_to, rook_square, empty, crossed = CASTLING[right]
+        if square != king_from or squares[rook_square] != rook:
+            continue
+        if any(squares[between] is not None for between in empty):
+            continue
+        if any(is_attacked(squares, crossed_square, enemy) for crossed_square in crossed):
+            continue
+        targets.append(king_to)
+    return targets
+
+def piece_targets(squares, square, en_passant=None, castling="-"):
+    """Pseudo legal destination squares of whichever piece stands on the square
+
+    Args:
+        squares (list): 64 entry mailbox of piece codes
+        square (int): index of the moving piece
+        en_passant (int, optional): index of the en passant target square. Defaults to None.
+        castling (str, optional): castling rights in FEN notation. Defaults to "-".
+
+    Returns:
+        list: indices of all reachable squares
+    """
+    kind = squares[square].lower()
+    if kind == "p":
+        return pawn_targets(squares, square, en_passant)
+    if kind == "n":
+        return leaper_targets(squares, square, KNIGHT_TARGETS)
+    if kind == "b":
+        return slider_targets(squares, square, DIAGONAL)
+    if kind == "r":
+        return slider_targets(squares, square, ORTHOGONAL)
+    if kind == "q":
+        return slider_targets(squares, square, ALL_DIRECTIONS)
+    targets = leaper_targets(squares, square, KING_TARGETS)
+    targets.extend(castling_targets(squares, square, castling))
+    return targets
+
+# Moves are packed into 16 bit ints: from square (6 bits), to square (6 bits) and promotion piece (3 bits)
+PROMOTION_CODES = " nbrq" # index 0 means no promotion
+
+def encode_move(from_square, to_square, promotion=0):
+    """Packs a move into an int, promotion is an index into PROMOTION_CODES"""
+    return from_square | (to_square << 6) | (promotion << 12)
+
+def move_from(move):
+    return move & 63
+
+def move_to(move):
+    return (move >> 6) & 63
+
+def move_promotion(move):
+    return move >> 12
+
+def move_to_uci(move):
+    """Converts an encoded move to UCI notation ("e2e4", "a7a8q")"""
+    promotion = PROMOTION_CODES[move >> 12].strip()
+    return f"{SQUARE_NAMES[move & 63]}{SQUARE_NAMES[(move >> 6) & 63]}{promotion}"
+
+def uci_to_move(uci):
+    """Converts a UCI move string to an encoded move"""
+    promotion = PROMOTION_CODES.index(uci[4].lower()) if len(uci) == 5 else 0
+    return encode_move(SQUARE_INDEX[uci[:2]], SQUARE_INDEX[uci[2:4]], promotion)
@@ -0,0 +1,155 @@
+# Perft (performance test): counts the leaf nodes of the legal move tree to a given depth.
+# Used both as a correctness suite for the move generators and as a benchmark (nodes/second).
+#
+#   python perft.py                                   run the standard corpus
+#   python perft.py --fen "<fen>" --depth 4 --divide  node count per root move
+#   python perft.py --backend bitboard --verify       compare every count against python-chess
+import argparse
+import sys
+import time
+
+import movegen
+from position import Position, START_FEN
+from bitboard import BitboardPosition
+
+BACKENDS = {"mailbox" : Position, "bitboard" : BitboardPosition}
+
+# name, fen, known node counts for depth 1, 2, 3, ... and the depth the quick suite runs to
+CORPUS = [
+    ("start position", START_FEN, (20, 400, 8902, 197281, 4865609), 4),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", (48, 2039, 97862, 4085603), 3),
+    ("en passant and pins", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238, 674624), 4),
+    ("promotions and castling", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", (6, 264, 9467, 422333), 3),
+    ("promotion with capture", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", (44, 1486, 62379, 2103487), 3),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", (46, 2079, 89890, 3894594), 3),
+    ("illegal en passant (pin)", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", (18, 92, 1670, 10138, 185429, 1134888), 5),
+    ("illegal en passant (discovered)", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", (13, 102, 1266, 10276, 135655, 1015133), 5),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", (15, 126, 1928, 13931, 206379, 1440467), 5),
+    ("castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", (15, 66, 1198, 6399, 120330, 661072), 5),
+    ("castling through attacks", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", (26, 1141, 27826, 1274206), 3),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", (11, 133, 1442, 19174, 266199, 3821001), 4),
+    ("underpromote to give check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", (6, 27, 273, 1329, 18135, 92683), 5),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", (2, 6, 13, 63, 382, 2217), 6),
+]
+
+def perft(position, depth : int):
+    """Counts the leaf nodes of the legal move tree
+
+    Args:
+        position (Position or BitboardPosition): position to count from, restored when the function returns
+        depth (int): number of plies to search
+
+    Returns:
+        int: number of leaf nodes
+    """
+    moves = position.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+def divide(position, depth : int):
+    """Leaf node count below every root move
+
+    Returns:
+        dict: UCI move -> node count
+    """
+    counts = {}
+    for move in position.legal_moves():
+        position.make_move(move)
+        counts[movegen.move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return counts
+
+def reference_divide(fen : str, depth : int):
+    """The same per move counts computed by python-chess, used as an independent reference"""
+    import chess
+
+    board = chess.Board(fen)
+
+    def count(depth):
+        if depth <= 1:
+            return board.legal_moves.count() if depth == 1 else 1
+        nodes = 0
+        for move in board.legal_moves:
+            board.push(move)
+            nodes += count(depth - 1)
+            board.pop()
+        return nodes
+
+    counts = {}
+    for move in list(board.legal_moves):
+        board.push(move)
+        counts[move.uci()] = count(depth - 1)
+        board.pop()
+    return counts
+
+def timed_perft(backend : str, fen : str, depth : int):
+    """Runs perft and returns (nodes, seconds)"""
+    position = BACKENDS[backend](fen)
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    return nodes, time.perf_counter() - start
+
+def run_suite(backend : str, depth : int = None, verify : bool = False):
+    """Runs the corpus and prints one line per position
+
+    Args:
+        backend (str): "mailbox" or "bitboard"
+        depth (int, optional): overrides the quick depth of every position (capped at the deepest known count)
+        verify (bool, optional): also compare the move generator against python-chess
+
+    Returns:
+        bool: True if every count matched
+    """
+    passed = True
+    total_nodes = total_time = 0
+    for name, fen, counts, quick_depth in CORPUS:
+        run_depth = min(depth or quick_depth, len(counts))
+        nodes, seconds = timed_perft(backend, fen, run_depth)
+        ok = nodes == counts[run_depth - 1]
+        if verify:
+            ok = ok and divide(BACKENDS[backend](fen), run_depth) == reference_divide(fen, run_depth)
+        passed = passed and ok
+        total_nodes += nodes
+        total_time += seconds
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<32} depth {run_depth}  nodes {nodes:>9}  "
+              f"expected {counts[run_depth - 1]:>9}  {nodes / seconds:>9.0f} nodes/s")
+    print(f"{backend}: {total_nodes} nodes in {total_time:.2f}s, {total_nodes / total_time:.0f} nodes/s")
+    return passed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft correctness suite and move generation benchmark")
+    parser.add_argument("--fen", help="count from this position instead of running the corpus")
+    parser.add_argument("--depth", type=int, help="search depth (defaults to each corpus entry's quick depth, or 4 with --fen)")
+    parser.add_argument("--divide", action="store_true", help="print the node count below every root move")
+    parser.add_argument("--backend", choices=BACKENDS, default="mailbox")
+    parser.add_argument("--verify", action="store_true", help="check the counts against python-chess")
+    args = parser.parse_args(argv)
+
+    if args.fen is None:
+        return 0 if run_suite(args.backend, args.depth, args.verify) else 1
+
+    depth = args.depth or 4
+    start = time.perf_counter()
+    counts = divide(BACKENDS[args.backend](args.fen), depth)
+    seconds = time.perf_counter() - start
+    if args.divide:
+        for move, nodes in sorted(counts.items()):
+            print(f"{move}: {nodes}")
+    nodes = sum(counts.values()) if depth > 0 else 1
+    print(f"nodes {nodes} in {seconds:.2f}s, {nodes / seconds:.0f} nodes/s")
+
+    if args.verify:
+        reference = reference_divide(args.fen, depth)
+        mismatches = sorted(move for move in set(reference) | set(counts) if reference.get(move) != counts.get(move))
+        print("python-chess agrees" if not mismatches else f"python-chess disagrees on: {', '.join(mismatches)}")
+        return 1 if mismatches else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
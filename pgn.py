@@ -0,0 +1,290 @@
+# PGN import and export. Archives are read line by line and one game at a time, so any size is streamed
+# with constant memory, and games are replayed on position.Position (no sprites, no python-chess).
+#
+#   python pgn.py games.pgn                   replay every game and report games/s (and the games that don't replay)
+#   python pgn.py games.pgn -o clean.pgn      also write the replayed games back out with normalized SAN
+import re
+import sys
+import time
+
+import history
+import movegen
+from position import Position, START_FEN
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAGS = ("Event", "Site", "Date", "Round", "White", "Black", "Result") # written first and in this order
+
+HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r"[{}();]|[^\s{}();]+")
+MOVE_NUMBER = re.compile(r"^\d*\.+")
+SAN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?")
+CASTLING = {"O-O" : 2, "0-0" : 2, "O-O-O" : -2, "0-0-0" : -2} # king step
+
+class PGNError(ValueError):
+    pass
+
+def parse_san(position, text : str):
+    """Finds the legal move a SAN string describes
+
+    Args:
+        position (position.Position): position the move is played in
+        text (str): the move ("e4", "Nbd7", "exd8=Q+", "O-O", annotations like "!?" are ignored)
+
+    Raises:
+        PGNError: if the move is malformed, illegal or ambiguous
+
+    Returns:
+        int: movegen encoded move
+    """
+    san = text.rstrip("+#!?")
+    if san in CASTLING:
+        king = position.king_square(position.turn)
+        move = movegen.encode_move(king, king + CASTLING[san])
+        if move not in position.legal_moves(king):
+            raise PGNError(f"illegal move {text}")
+        return move
+
+    match = SAN.fullmatch(san)
+    if match is None:
+        raise PGNError(f"can't read move {text}")
+    letter, file, rank, target, promotion = match.groups()
+    code = letter or "P"
+    code = code if position.turn == "w" else code.lower()
+    target = movegen.SQUARE_INDEX[target]
+    promotion = movegen.PROMOTION_CODES.index(promotion.lower()) if promotion else 0
+
+    found = []
+    for square, piece in enumerate(position.squares):
+        if piece != code or (file and movegen.FILES[square % 8] != file) or (rank and str(square // 8 + 1) != rank):
+            continue
+        found.extend(move for move in position.legal_moves(square) if (move >> 6) & 63 == target and move >> 12 == promotion)
+    if len(found) != 1:
+        raise PGNError(f"{'ambiguous' if found else 'illegal'} move {text}")
+    return found[0]
+
+def san(position, move : int):
+    """SAN of a legal move, with the check or mate suffix
+
+    Args:
+        position (position.Position): position the move is played in (left unchanged)
+        move (int): movegen encoded move
+
+    Returns:
+        str: the move in SAN
+    """
+    from_square, to_square, promotion = move & 63, (move >> 6) & 63, move >> 12
+    code = position.squares[from_square]
+    target = movegen.SQUARE_NAMES[to_square]
+
+    if code in "Kk" and abs(to_square - from_square) == 2:
+        text = "O-O" if to_square > from_square else "O-O-O"
+    elif code in "Pp":
+        capture = from_square % 8 != to_square % 8
+        text = f"{movegen.FILES[from_square % 8]}x{target}" if capture else target
+        if promotion:
+            text += "=" + movegen.PROMOTION_CODES[promotion].upper()
+    else:
+        # other pieces of the same type that could go to the target as well
+        rivals = [square for square, piece in enumerate(position.squares) if piece == code and square != from_square
+                  and any((other >> 6) & 63 == to_square for other in position.legal_moves(square))]
+        prefix = ""
+        if rivals:
+            if all(square % 8 != from_square % 8 for square in rivals):
+                prefix = movegen.FILES[from_square % 8]
+            elif all(square // 8 != from_square // 8 for square in rivals):
+                prefix = str(from_square // 8 + 1)
+            else:
+                prefix = movegen.SQUARE_NAMES[from_square]
+        capture = "x" if position.squares[to_square] is not None else ""
+        text = f"{code.upper()}{prefix}{capture}{target}"
+
+    position.make_move(move)
+    if position.is_check():
+        text += "+" if position.legal_moves() else "#"
+    position.unmake_move()
+    return text
+
+def read_games(file):
+    """Yields the games of a PGN file one at a time, only the game being read is held in memory
+
+    Comments, variations and NAGs are skipped, only the main line is kept.
+
+    Args:
+        file (file): text file (or any iterable of lines)
+
+    Yields:
+        tuple: (headers dict, list of SAN moves, result token or None)
+    """
+    headers, moves, result = {}, [], None
+    comment = False # inside {...}, which may span lines
+    variation = 0 # depth of (...) being skipped
+
+    for line in file:
+        if line.startswith("%"): # escaped line
+            continue
+        if not comment and not variation and line.lstrip().startswith("["):
+            match = HEADER.match(line.strip())
+            if match:
+                if moves: # the previous game had no result token
+                    yield headers, moves, result
+                    headers, moves, result = {}, [], None
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+
+        for token in TOKEN.findall(line):
+            if comment:
+                comment = token != "}"
+            elif token == "{":
+                comment = True
+            elif token == ";":
+                break # comment to the end of the line
+            elif token == "(":
+                variation += 1
+            elif token == ")":
+                variation = max(variation - 1, 0)
+            elif variation or token.startswith("$"):
+                continue
+            elif token in RESULTS:
+                result = token
+                yield headers, moves, result
+                headers, moves, result = {}, [], None
+            else:
+                token = MOVE_NUMBER.sub("", token, count=1) # "12." and "12...", also glued to the move ("12.e4")
+                if token:
+                    moves.append(token)
+
+    if headers or moves:
+        yield headers, moves, result
+
+def replay(headers : dict, moves : list):
+    """Plays a game's moves from its start position (the FEN tag, or the standard start)
+
+    Raises:
+        PGNError: if the FEN tag is malformed or at the first move that isn't legal
+
+    Returns:
+        history.GameHistory: the game line as encoded moves
+    """
+    fen = headers.get("FEN") or START_FEN
+    try:
+        position = Position(fen)
+    except ValueError as e:
+        raise PGNError(f"bad FEN tag: {e}") from None
+    line = history.GameHistory(fen)
+    for ply, text in enumerate(moves):
+        try:
+            move = parse_san(position, text)
+        except PGNError as e:
+            raise PGNError(f"{e} at ply {ply + 1}") from None
+        position.make_move(move)
+        line.append(move, position.fen() if (ply + 1) % line.snapshot_interval == 0 else None)
+    return line
+
+def result_of(position):
+    """Result of a game that ended in this position: decided by mate or stalemate, "*" otherwise"""
+    if position.legal_moves():
+        return "1/2-1/2" if position.is_repetition() else "*"
+    if not position.is_check():
+        return "1/2-1/2"
+    return "0-1" if position.turn == "w" else "1-0"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def format_game(headers : dict, line, result : str = None, width : int = 80):
+    """Writes a game as PGN text
+
+    Args:
+        headers (dict): tags, the seven tag roster comes first (missing ones are written as "?")
+        line (history.GameHistory): the moves, replayed from the line's start position to get their SAN
+        result (str, optional): game termination. Defaults to the Result tag or the result the final position decides.
+        width (int, optional): movetext line length. Defaults to 80.
+
+    Returns:
+        str: the game, ending with a blank line
+    """
+    start = line.fen(0)
+    position = Position(start)
+    tokens = []
+    for ply, move in enumerate(line):
+        text = san(position, move)
+        if position.turn == "w":
+            text = f"{position.full_moves}. {text}" # the number stays on the line of its move
+        elif ply == 0:
+            text = f"{position.full_moves}... {text}"
+        tokens.append(text)
+        position.make_move(move)
+    result = result or headers.get("Result") or result_of(position)
+    tokens.append(result)
+
+    tags = {name : "?" for name in SEVEN_TAGS}
+    tags.update(headers)
+    tags["Result"] = result
+    if start != START_FEN:
+        tags["SetUp"], tags["FEN"] = "1", start
+    text = [f'[{name} "{_escape(value)}"]' for name, value in tags.items()]
+    text.append("")
+
+    row = ""
+    for token in tokens:
+        if row and len(row) + 1 + len(token) > width:
+            text.append(row)
+            row = token
+        else:
+            row = f"{row} {token}" if row else token
+    text.append(row)
+    return "\n".join(text) + "\n\n"
+
+def session_headers(board):
+    """Tags for the game played on a board: date and the player types"""
+    players = {board.player_1.color : board.player_1, board.player_2.color : board.player_2}
+    return {"Event" : "Casual game", "Site" : "Chess Interface", "Date" : time.strftime("%Y.%m.%d"),
+            "Round" : "-", "White" : type(players["w"]).__name__, "Black" : type(players["b"]).__name__}
+
+def export(board, file):
+    """Writes the game played on a board (the whole game line, wherever the board is in it) as PGN
+
+    Args:
+        board (setup.Board): the board of the session
+        file (file): text file the game is appended to
+    """
+    file.write(format_game(session_headers(board), board.history))
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay every game of a PGN file and report the replay speed")
+    parser.add_argument("input", nargs="?", help="PGN file (defaults to stdin)")
+    parser.add_argument("-o", "--output", help="write the replayed games here with normalized SAN")
+    parser.add_argument("--quiet", action="store_true", help="don't list the games that fail to replay")
+    args = parser.parse_args(argv)
+
+    source = open(args.input, encoding="utf-8", errors="replace") if args.input else sys.stdin
+    output = open(args.output, "w") if args.output else None
+    games = moves = failed = 0
+    start = time.perf_counter()
+    try:
+        for games, (headers, sans, result) in enumerate(read_games(source), 1):
+            try:
+                line = replay(headers, sans)
+            except PGNError as e:
+                failed += 1
+                if not args.quiet:
+                    print(f"game {games} ({headers.get('White', '?')} - {headers.get('Black', '?')}): {e}", file=sys.stderr)
+                continue
+            moves += len(line)
+            if output is not None:
+                output.write(format_game(headers, line, result))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not None:
+            output.close()
+
+    seconds = time.perf_counter() - start
+    print(f"{games} games ({failed} failed), {moves} moves in {seconds:.2f}s: "
+          f"{games / seconds if seconds else 0:.1f} games/s, {moves / seconds if seconds else 0:.0f} moves/s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,9 @@
-import pygame as pg
+import threading
+import book
+import tablebase
+import movegen
+import position
+import search
 from abc import ABC, abstractmethod
 
 class Player(ABC):
@@ -6,60 +11,125 @@ class Player(ABC):
         super().__init__()
         self.color = color
         self.board = board
+        self.lookup_miss = None # last position neither the book nor the tablebases had a move for, so they aren't probed every frame
 
     @abstractmethod
     def move(self):
         pass
 
+    def highlights(self):
+        """Squares (movegen indices) marked as possible moves while the player picks a move"""
+        return []
+
+    def known_move(self):
+        """Plays a move that needs no search if there is one: from the opening book, or from the tablebases
+        in endgames they cover
+
+        Returns:
+            bool: True if a move was played
+        """
+        fen = self.board.current_fen
+        if fen == self.lookup_miss:
+            return False
+        move = None
+        for source in (book.get_book(), tablebase.get_tablebases()):
+            if source is None:
+                continue
+            try:
+                move = source.choose(fen)
+            except Exception as e: # a broken book or table file shouldn't stop the game, the engine takes over
+                print(e)
+            if move is not None:
+                break
+        if move is None:
+            self.lookup_miss = fen
+            return False
+        self.board.play_move(move)
+        self.finish_move()
+        return True
+
+    def finish_move(self):
+        """Records the move just played, starts its background analysis and checks if the game is over"""
+        self.board.record_move()
+        self.board.request_analysis()
+        if self.board.game_over(self.board.current_fen) != None:
+            self.board.running = False
+
 class AI(Player):
     """Class that represents an AI
     """
     def __init__(self, color, board) -> None:
         super().__init__(color, board)
+        self.failed = None # position whose analysis gave no usable move, reported once instead of every frame
 
     def move(self):
-        """Translates Stockfish's best move calculation to fit the move generation functions input
+        """Translates Stockfish's best move calculation to fit the move generation functions input.
+        The search runs in the background, until its result for the current position arrives this returns immediately.
         """
         if self.board.to_move == self.color:
-            # calculation and translation
-            en_passant = self.board.en_passant
-            best_move = str(self.board.analyze_position(self.board.current_fen, self.board.ai_depth)[0])
-            if "x" in best_move:
-                best_move = best_move.replace("x", "")
-            if len(best_move) == 5:
-                best_move = best_move[:4]
-            if best_move == "O-O":
-                best_move = "e1g1" if self.color == "w" else "e8g8"
-            elif best_move == "O-O-O":
-                best_move = "e1c1" if self.color == "w" else "e8c8"
+            if self.known_move():
+                return
+            if self.board.analysis_fen != self.board.current_fen:
+                self.failed = None # a new analysis gets a new chance
+                self.board.request_analysis()
+                return
+            if self.failed == self.board.current_fen:
+                return
+
+            # translation (the position switches side, move counts and en passant itself)
+            best_move = str(self.board.best_move)
 
             try:
-                piece = self.board.occ_squares[best_move[:2]]
-                piece.play(self.board.square_dict[best_move[2::]])
-            except KeyError:
-                print(best_move)    
-
-            # switching side, updating move count, fen and en passant
-            self.board.to_move = "w" if self.board.to_move == "b" else "b"
-            self.board.half_moves = str(int(self.board.half_moves) + 1)
-            self.board.full_moves = str(int(self.board.full_moves) + 1) if self.color == "b" else self.board.full_moves
-            if self.board.en_passant == en_passant:
-                self.board.en_passant = "-"
-            
-            self.board.current_fen = self.board.gen_fen()
-            
-            # adding position to the positions list
-            if self.board.game_position_index == -1:
-                self.board.game_positions.append(self.board.current_fen)
-            else:
-                self.board.game_positions = self.board.game_positions[:self.board.game_position_index]
-                self.board.game_positions.append(self.board.current_fen)  
-                self.board.game_position_index = -1  
-            
-            # analyzing board and checking if game over
-            self.board.position_analysis = self.board.analyze_position(self.board.current_fen, self.board.ai_depth)[1]
-            if self.board.game_over(self.board.current_fen) != None:
-                self.board.running = False
+                if self.board.best_move is None:
+                    raise ValueError(self.board.position_analysis)
+                self.board.play_move(movegen.uci_to_move(best_move))
+            except (KeyError, ValueError) as e:
+                print(f"no move from the analysis: {e}")
+                self.failed = self.board.current_fen
+                return
+
+            self.finish_move()
+
+class SearchAI(Player):
+    """AI running the built-in engine (search.py), no external binary needed.
+    The search runs on a worker thread on a copy of the position, until it's done this returns immediately.
+
+    Args:
+        movetime (float, optional): seconds per move, the search stops earlier when the board's AI depth is reached. Defaults to 3.0.
+        workers (int, optional): search processes, more than one runs the parallel (Lazy SMP) search. Defaults to 1.
+    """
+    def __init__(self, color, board, movetime=3.0, workers=1) -> None:
+        super().__init__(color, board)
+        self.movetime = movetime
+        self.searcher = search.Searcher() if workers == 1 else search.ParallelSearcher(workers)
+        self.info = None # info of the last finished search (depth, score, nodes, nps, pv)
+        self._result = None # (fen, info) handed over by the worker thread
+        self._thread = None
+
+    def move(self):
+        if self.board.to_move != self.color:
+            return
+        fen = self.board.current_fen
+        result = self._result
+        if result is not None and result[0] == fen:
+            self._result = None
+            self.info = result[1]
+            print(f"depth {self.info['depth']} score {self.info['score']} nodes {self.info['nodes']} nps {self.info['nps']}")
+            if self.info["move"] is not None:
+                self.board.play_move(self.info["move"])
+                self.finish_move()
+            return
+
+        if self._thread is None or not self._thread.is_alive():
+            if self.known_move():
+                return
+            searched = position.Position(fen)
+            searched.repetitions = dict(self.board.position.repetitions) # so the search sees repetition draws
+            self._thread = threading.Thread(target=self._search, args=(fen, searched), daemon=True)
+            self._thread.start()
+
+    def _search(self, fen, searched):
+        self._result = (fen, self.searcher.search(searched, depth=self.board.ai_depth, movetime=self.movetime))
 
 class Human(Player):
     """Class that represents a human player
@@ -68,58 +138,40 @@ class Human(Player):
         super().__init__(color, board)
         self.pressed = None
 
-    def move(self, display):   
-        """Generates, possible moves for a selected piece, displays possible moves on screen and executes a move once chosen.
+    def move(self):   
+        """Generates possible moves for a selected piece and executes a move once chosen (see highlights for displaying them)"""
+        import pygame as pg # only a human needs the mouse, the other players run without pygame
 
-        Args:
-            display (pg.display): the display obj which the moves are to be displayed on
-        """
         if self.board.to_move == self.color:
-            en_passant = self.board.en_passant
-            
             # if a piece is highlighted
             if self.pressed is not None:
                 if self.pressed.moves == []:
                     self.pressed.moves = self.pressed.possible_moves() or []
 
                 self.pressed.rect.center = pg.mouse.get_pos()
-                for rect in self.pressed.moves:
-                    pg.draw.ellipse(display, "#3E2723", rect.scale_by(0.4, 0.4))
-                    if rect.collidepoint(pg.mouse.get_pos()) and pg.mouse.get_pressed()[0]:
-                        # Switch playing side, clear current move list and move the piece to its new square
-                        self.pressed.play(rect)
+                if pg.mouse.get_pressed()[0]:
+                    # the square under the cursor is computed, not searched for
+                    square = self.board.square_at(pg.mouse.get_pos())
+                    if square is not None and square in self.pressed.moves:
+                        # Move the piece to its new square (switches playing side) and clear current move list
+                        self.pressed.play(square)
                         self.pressed.moves.clear()
                         self.pressed = None
-                        self.board.to_move = "b" if self.board.to_move == "w" else "w"
-                        # updating move count, fen and en passant
-                        self.board.half_moves = str(int(self.board.half_moves) + 1)
-                        self.board.full_moves = str(int(self.board.full_moves) + 1) if self.color == "b" else self.board.full_moves
-                        if self.board.en_passant == en_passant:
-                            self.board.en_passant = "-"
-                        self.board.current_fen = self.board.gen_fen()
-                        
-                        # adding position to the positions list
-                        if self.board.game_position_index == -1:
-                            self.board.game_positions.append(self.board.current_fen)
-                        else:
-                            self.board.game_positions = self.board.game_positions[:self.board.game_position_index]
-                            self.board.game_positions.append(self.board.current_fen)  
-                            self.board.game_position_index = -1  
-                        
-                        # analyzing board and checking if game over
-                        self.board.position_analysis = self.board.analyze_position(self.board.current_fen, self.board.ai_depth)[1]
-                        if self.board.game_over(self.board.current_fen) != None:
-                            self.board.running = False
+                        self.finish_move()
                         return
                 
                 # unhighlights piece
                 if pg.mouse.get_pressed()[2]:
-                    self.pressed.rect.center = self.board.square_dict[self.pressed.square].center
                     self.pressed.moves.clear()   
                     self.pressed = None   
-            else:  
-                for piece in self.board.pieces["white"].sprites() if self.color == "w" else self.board.pieces["black"].sprites(): 
-                    if piece.rect.collidepoint(pg.mouse.get_pos()) and pg.mouse.get_pressed()[0]:
-                        self.pressed = piece         
-        
-        
\ No newline at end of file
+            elif pg.mouse.get_pressed()[0]:
+                square = self.board.square_at(pg.mouse.get_pos())
+                piece = self.board.occ_squares.get(movegen.SQUARE_NAMES[square]) if square is not None else None
+                if piece is not None and piece.color[0].lower() == self.color:
+                    self.pressed = piece
+
+    def highlights(self):
+        """Possible moves of the highlighted piece"""
+        if self.pressed is None or self.board.to_move != self.color:
+            return []
+        return self.pressed.moves
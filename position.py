@@ -0,0 +1,279 @@
+# Logical game state (no pygame). The board is a movegen mailbox and moves are made and taken back
+# through an undo stack, so legality checks, search and history traversal never touch sprites.
+import movegen
+import zobrist
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# castling rights lost when a move starts or ends on one of these squares
+CASTLING_LOSS = {0 : "Q", 4 : "KQ", 7 : "K", 56 : "q", 60 : "kq", 63 : "k"}
+
+PIECE_CODES = "PNBRQKpnbrqk"
+
+class Position():
+    """Holds the board, side to move, castling rights, en passant square and move counters
+
+    Moves are movegen encoded ints (see movegen.encode_move).
+    """
+    def __init__(self, fen : str = None) -> None:
+        self.squares = [None] * 64
+        self.turn = "w"
+        self.castling = "-"
+        self.en_passant = None
+        self.half_moves = 0
+        self.full_moves = 1
+        self.stack = [] # undo records: (move, captured piece, captured square, castling, en passant, half moves, key)
+        self.key = 0 # Zobrist key, updated incrementally by make_move
+        self.repetitions = {} # Zobrist key -> how often the position occurred in the game so far
+        self._check_info = None # checkers, evasions and pins of the side to move, computed lazily once per position
+        self.set_fen(fen or START_FEN)
+
+    def set_fen(self, fen : str):
+        """Loads a FEN string into the position and clears the undo stack
+
+        Raises:
+            ValueError: if the FEN is malformed (the position is left as it was)
+        """
+        fields = fen.split()
+        if len(fields) != 6:
+            raise ValueError(f"expected 6 FEN fields, got {len(fields)}: {fen!r}")
+        placement, turn, castling, en_passant, half_moves, full_moves = fields
+        squares = [None] * 64
+        ranks = placement.split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"expected 8 ranks in the FEN, got {len(ranks)}: {fen!r}")
+        for rank, row in zip(range(7, -1, -1), ranks):
+            file = 0
+            for char in row:
+                if char in "12345678":
+                    file += int(char)
+                elif char in PIECE_CODES and file < 8:
+                    if char in "Pp" and rank in (0, 7):
+                        raise ValueError(f"pawn on the first or last rank in the FEN: {fen!r}")
+                    squares[rank * 8 + file] = char
+                    file += 1
+                else:
+                    raise ValueError(f"invalid character {char!r} in the FEN: {fen!r}")
+            if file != 8:
+                raise ValueError(f"rank {rank + 1} of the FEN doesn't have 8 squares: {fen!r}")
+        if squares.count("K") != 1 or squares.count("k") != 1:
+            raise ValueError(f"each side needs exactly one king: {fen!r}")
+        if turn not in ("w", "b"):
+            raise ValueError(f"invalid side to move {turn!r} in the FEN: {fen!r}")
+        if castling != "-" and (not castling or any(char not in "KQkq" for char in castling) or len(set(castling)) != len(castling)):
+            raise ValueError(f"invalid castling rights {castling!r} in the FEN: {fen!r}")
+        if en_passant != "-" and (en_passant not in movegen.SQUARE_INDEX or en_passant[1] != ("6" if turn == "w" else "3")):
+            raise ValueError(f"invalid en passant square {en_passant!r} in the FEN: {fen!r}")
+        if not (half_moves.isdigit() and full_moves.isdigit()):
+            raise ValueError(f"invalid move counters in the FEN: {fen!r}")
+
+        self.squares = squares
+        self.turn = turn
+        self.castling = castling
+        self.en_passant = movegen.SQUARE_INDEX.get(en_passant)
+        self.half_moves = int(half_moves)
+        self.full_moves = int(full_moves)
+        self.stack = []
+        self._check_info = None
+        self.key = zobrist.hash_position(self.squares, self.turn, self.castling, self.en_passant)
+        self.repetitions = {self.key : 1}
+
+    def fen(self):
+        """Generates a FEN string of the position"""
+        rows = []
+        for rank in reversed(range(8)):
+            row, empty = [], 0
+            for code in self.squares[rank * 8:rank * 8 + 8]:
+                if code is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row.append(str(empty))
+                    empty = 0
+                row.append(code)
+            if empty:
+                row.append(str(empty))
+            rows.append("".join(row))
+        en_passant = movegen.SQUARE_NAMES[self.en_passant] if self.en_passant is not None else "-"
+        return f"{'/'.join(rows)} {self.turn} {self.castling} {en_passant} {self.half_moves} {self.full_moves}"
+
+    def king_square(self, color : str):
+        return self.squares.index("K" if color == "w" else "k")
+
+    def is_check(self):
+        """Checks if the side to move is in check"""
+        return movegen.is_attacked(self.squares, self.king_square(self.turn), "b" if self.turn == "w" else "w")
+
+    def is_repetition(self, count : int = 3):
+        """Checks whether the current position occurred at least `count` times (threefold repetition by default)"""
+        return self.repetitions.get(self.key, 0) >= count
+
+    def make_move(self, move : int):
+        """Plays a move and pushes a compact undo record so unmake_move can restore the position in O(1).
+        The Zobrist key is updated incrementally.
+
+        Args:
+            move (int): movegen encoded move, assumed to be at least pseudo legal
+        """
+        squares = self.squares
+        self._check_info = None
+        from_square, to_square, promotion = move & 63, (move >> 6) & 63, move >> 12
+        piece = squares[from_square]
+        captured, captured_square = squares[to_square], to_square
+        pawn = piece == "P" or piece == "p"
+        piece_keys = zobrist.PIECE_KEYS
+        key = self.key ^ zobrist.BLACK_TO_MOVE
+        if self.en_passant is not None:
+            key ^= zobrist.en_passant_key(squares, self.en_passant, self.turn)
+
+        # en passant captures a pawn that isn't standing on the target square
+        if pawn and to_square == self.en_passant:
+            captured_square = to_square - 8 if piece == "P" else to_square + 8
+            captured = squares[captured_square]
+            squares[captured_square] = None
+        self.stack.append((move, captured, captured_square, self.castling, self.en_passant, self.half_moves, self.key))
+        if captured is not None:
+            key ^= piece_keys[captured][captured_square]
+
+        if promotion:
+            promoted = movegen.PROMOTION_CODES[promotion]
+            placed = promoted.upper() if piece == "P" else promoted
+        else:
+            placed = piece
+        squares[to_square] = placed
+        squares[from_square] = None
+        key ^= piece_keys[piece][from_square] ^ piece_keys[placed][to_square]
+
+        # castling moves the rook along with the king
+        if (piece == "K" or piece == "k") and abs(to_square - from_square) == 2:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            rook = squares[rook_from]
+            squares[rook_to] = rook
+            squares[rook_from] = None
+            key ^= piece_keys[rook][rook_from] ^ piece_keys[rook][rook_to]
+
+        if self.castling != "-" and (from_square in CASTLING_LOSS or to_square in CASTLING_LOSS):
+            lost = CASTLING_LOSS.get(from_square, "") + CASTLING_LOSS.get(to_square, "")
+            castling = "".join(right for right in self.castling if right not in lost) or "-"
+            key ^= zobrist.castling_key(self.castling) ^ zobrist.castling_key(castling)
+            self.castling = castling
+
+        self.en_passant = (from_square + to_square) // 2 if pawn and abs(to_square - from_square) == 16 else None
+        self.half_moves = 0 if pawn or captured is not None else self.half_moves + 1
+        if self.turn == "b":
+            self.full_moves += 1
+        self.turn = "b" if self.turn == "w" else "w"
+        if self.en_passant is not None:
+            key ^= zobrist.en_passant_key(squares, self.en_passant, self.turn)
+
+        self.key = key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+
+    def unmake_move(self):
+        """Takes back the last move played with make_move
+
+        Returns:
+            int: the move that was taken back
+        """
+        count = self.repetitions[self.key] - 1
+        if count:
+            self.repetitions[self.key] = count
+        else:
+            del self.repetitions[self.key]
+        move, captured, captured_square, self.castling, self.en_passant, self.half_moves, self.key = self.stack.pop()
+        squares = self.squares
+        self._check_info = None
+        from_square, to_square = move & 63, (move >> 6) & 63
+        self.turn = "b" if self.turn == "w" else "w"
+        if self.turn == "b":
+            self.full_moves -= 1
+
+        piece = squares[to_square]
+        if move >> 12:
+            piece = "P" if piece.isupper() else "p"
+        squares[from_square] = piece
+        squares[to_square] = None
+        if captured is not None:
+            squares[captured_square] = captured
+
+        if (piece == "K" or piece == "k") and abs(to_square - from_square) == 2:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            squares[rook_from] = squares[rook_to]
+            squares[rook_to] = None
+        return move
+
+    def piece_moves(self, square : int):
+        """Pseudo legal moves of the piece on the square (pawns reaching the last rank promote to every piece)"""
+        code = self.squares[square]
+        targets = movegen.piece_targets(self.squares, square, self.en_passant, self.castling)
+        if (code == "P" or code == "p") and square // 8 in (1, 6):
+            last_rank = 7 if code == "P" else 0
+            moves = []
+            for target in targets:
+                if target // 8 == last_rank:
+                    moves.extend(movegen.encode_move(square, target, promotion) for promotion in (4, 3, 2, 1))
+                else:
+                    moves.append(movegen.encode_move(square, target))
+            return moves
+        return [square | target << 6 for target in targets]
+
+    def check_info(self):
+        """Checking squares, evasion squares and pin rays of the side to move (see movegen.check_info)"""
+        if self._check_info is None:
+            self._check_info = movegen.check_info(self.squares, self.king_square(self.turn), self.turn)
+        return self._check_info
+
+    def is_legal(self, move : int):
+        """Checks whether a pseudo legal move leaves the mover's own king safe by playing it"""
+        color = self.turn
+        self.make_move(move)
+        legal = not movegen.is_attacked(self.squares, self.king_square(color), self.turn)
+        self.unmake_move()
+        return legal
+
+    def legal_moves(self, square : int = None):
+        """All legal moves of the side to move, or only those of the piece on the given square
+        (none if the square is empty or holds a piece of the other side)
+
+        Checkers and pins are computed once per position, so only king steps and en passant
+        captures need an individual attack test.
+        """
+        squares = self.squares
+        if square is None:
+            candidates = [index for index, code in enumerate(squares) if code is not None and movegen.color_of(code) == self.turn]
+        elif squares[square] is not None and movegen.color_of(squares[square]) == self.turn:
+            candidates = [square]
+        else:
+            return []
+        checkers, evasions, pins = self.check_info()
+        enemy = "b" if self.turn == "w" else "w"
+
+        moves = []
+        for from_square in candidates:
+            code = squares[from_square]
+            if code == "K" or code == "k":
+                # the king is lifted off the board so it can't shield the squares behind it
+                king_moves = self.piece_moves(from_square)
+                squares[from_square] = None
+                for move in king_moves:
+                    to_square = (move >> 6) & 63
+                    if abs(to_square - from_square) == 2 or not movegen.is_attacked(squares, to_square, enemy):
+                        moves.append(move) # castling was already tested square by square in movegen
+                squares[from_square] = code
+                continue
+
+            if len(checkers) > 1: # double check, only the king can move
+                continue
+            pin = pins.get(from_square)
+            for move in self.piece_moves(from_square):
+                to_square = (move >> 6) & 63
+                if (code == "P" or code == "p") and to_square == self.en_passant:
+                    if self.is_legal(move):
+                        moves.append(move)
+                    continue
+                if evasions is not None and to_square not in evasions:
+                    continue
+                if pin is not None and to_square not in pin:
+                    continue
+                moves.append(move)
+        return moves
@@ -0,0 +1,217 @@
+# Rendering helpers shared by every board and piece of the process.
+from collections import OrderedDict
+
+import pygame as pg
+
+class SpriteAtlas():
+    """Process-wide piece image cache. Each of the 12 piece PNGs is decoded once and the scaled
+    surfaces are cached per tile size, so pieces share surfaces instead of owning copies.
+
+    Args:
+        max_sizes (int, optional): number of tile sizes kept scaled before the least recently used is evicted. Defaults to 4.
+    """
+    def __init__(self, max_sizes=4) -> None:
+        self.max_sizes = max_sizes
+        self._sources = {} # (color, icon) -> decoded full size surface
+        self._scaled = OrderedDict() # tile size -> {(color, icon) : scaled surface}
+
+    def source(self, color : str, icon : str):
+        """The decoded full size image of a piece ("White"/"Black", "pawn"/"knight"/...)"""
+        surface = self._sources.get((color, icon))
+        if surface is None:
+            surface = pg.image.load(f"Pieces/{color}/{icon}.png").convert_alpha()
+            self._sources[(color, icon)] = surface
+        return surface
+
+    def image(self, color : str, icon : str, tile_size : int):
+        """The piece image scaled for the given tile size (shared, don't draw onto it)"""
+        scaled = self._scaled.get(tile_size)
+        if scaled is None:
+            scaled = self._scaled[tile_size] = {}
+            while len(self._scaled) > self.max_sizes:
+                self._scaled.popitem(last=False)
+        else:
+            self._scaled.move_to_end(tile_size)
+
+        surface = scaled.get((color, icon))
+        if surface is None:
+            surface = pg.transform.rotozoom(self.source(color, icon), 0, 0.6 * (tile_size/100))
+            scaled[(color, icon)] = surface
+        return surface
+
+atlas = SpriteAtlas()
+
+class DirtyRenderer():
+    """Redraws only the parts of the window that changed since the last frame.
+
+    The window background (fill, board squares and coordinates) is rendered once into a cached surface and
+    only rebuilt when the window size, tile size or board perspective changes. Each frame the regions of
+    sprites that moved, appeared or disappeared and of overlays (move markers, text) that changed are
+    restored from the cache, whatever overlaps them is drawn again and only those regions are pushed to the screen.
+
+    Args:
+        background_color (str, optional): window fill color. Defaults to "#161512".
+    """
+    def __init__(self, background_color="#161512") -> None:
+        self.background_color = background_color
+        self.background = None
+        self._background_key = None
+        self._sprites = {} # sprite -> (rect, image) it was drawn with last frame
+        self._overlays = {} # overlay key -> rect it was drawn at last frame
+
+    def invalidate(self):
+        """Forces the background to be rebuilt and the whole window to be redrawn on the next frame"""
+        self._background_key = None
+
+    def draw_background(self, display, board):
+        display.fill(self.background_color)
+        board.display_board(display)
+
+    def draw(self, display, board, sprites, overlays=()):
+        """Draws a frame
+
+        Args:
+            display (pg.Surface): the window surface
+            board (setup.Board): board whose squares and coordinates make up the background
+            sprites (list): sprites in drawing order
+            overlays (list, optional): (key, surface, rect) drawn on top of the sprites, an overlay is only
+              redrawn when its key or rect changes (or something beneath it changed)
+
+        Returns:
+            list: the rects that changed, to be passed to pg.display.update
+        """
+        key = (display.get_size(), board.tile_size, board.board_perspective)
+        full = key != self._background_key
+        if full:
+            self.background = pg.Surface(display.get_size())
+            self.draw_background(self.background, board)
+            self._background_key = key
+
+        sprite_state = {sprite : (sprite.rect.copy(), sprite.image) for sprite in sprites}
+        overlay_state = {overlay_key : rect for overlay_key, _, rect in overlays}
+
+        if full:
+            dirty = [display.get_rect()]
+        else:
+            dirty = []
+            for sprite, state in self._sprites.items():
+                if sprite_state.get(sprite) != state:
+                    dirty.append(state[0])
+            for sprite, state in sprite_state.items():
+                if self._sprites.get(sprite) != state:
+                    dirty.append(state[0])
+            for overlay_key, rect in self._overlays.items():
+                if overlay_state.get(overlay_key) != rect:
+                    dirty.append(rect)
+            for overlay_key, rect in overlay_state.items():
+                if self._overlays.get(overlay_key) != rect:
+                    dirty.append(rect)
+        self._sprites = sprite_state
+        self._overlays = overlay_state
+
+        # every region is rebuilt on its own with drawing clipped to it, a sprite overlapping it is only drawn
+        # over restored pixels (blending its alpha edges again outside the region would darken them)
+        clip = display.get_clip()
+        for rect in dirty:
+            display.set_clip(rect)
+            display.blit(self.background, rect, rect)
+            for sprite in sprites:
+                if sprite.rect.colliderect(rect):
+                    display.blit(sprite.image, sprite.rect)
+            for _, surface, overlay_rect in overlays:
+                if overlay_rect.colliderect(rect):
+                    display.blit(surface, overlay_rect)
+        display.set_clip(clip)
+        return dirty
+
+class TextCache():
+    """Bounded LRU of rendered text surfaces keyed by (font file, size, string, antialias, color).
+    Text that doesn't change between frames (FEN, evaluation, coordinates) is rasterized once.
+
+    Args:
+        max_entries (int, optional): number of surfaces kept before the least recently used is evicted. Defaults to 256.
+    """
+    def __init__(self, max_entries=256) -> None:
+        self.max_entries = max_entries
+        self._fonts = {} # (font file, size) -> pg.font.Font
+        self._surfaces = OrderedDict()
+
+    def font(self, path : str, size : int):
+        """A font whose render calls go through the cache (drop-in for pg.font.Font)"""
+        return CachedFont(self, path, size)
+
+    def render(self, path : str, size : int, text : str, antialias : bool, color):
+        key = (path, size, text, antialias, color)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            return surface
+
+        font = self._fonts.get((path, size))
+        if font is None:
+            font = self._fonts[(path, size)] = pg.font.Font(path, size)
+        surface = self._surfaces[key] = font.render(text, antialias, color)
+        while len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """Drops every cached surface and font (the window was resized, old sizes won't be drawn again)"""
+        self._surfaces.clear()
+        self._fonts.clear()
+
+class CachedFont():
+    """Font of a given file and size rendering through a TextCache"""
+    def __init__(self, cache : TextCache, path : str, size : int) -> None:
+        self.cache = cache
+        self.path = path
+        self.size = size
+
+    def render(self, text : str, antialias : bool, color):
+        return self.cache.render(self.path, self.size, text, antialias, color)
+
+text_cache = TextCache()
+
+_markers = {}
+
+def move_marker(rect):
+    """The dot that marks a possible move inside a square rect (one shared surface per size)"""
+    marker = _markers.get(rect.size)
+    if marker is None:
+        marker = _markers[rect.size] = pg.Surface(rect.size, pg.SRCALPHA)
+        pg.draw.ellipse(marker, "#3E2723", marker.get_rect())
+    return marker
+
+class View():
+    """Maps board squares (movegen indices, a1 = 0) to pixels and back. The board state knows nothing about
+    pixels, flipping or resizing only changes this transform and several views can show the same game.
+
+    Args:
+        tile_size (int): the size of each side of the board's squares
+        origin (tuple): pixel position of the board's top left corner
+        perspective (str, optional): "w" draws rank 1 at the bottom, "b" at the top. Defaults to "w".
+    """
+    def __init__(self, tile_size : int, origin : tuple, perspective="w") -> None:
+        self.tile_size = tile_size
+        self.origin = origin
+        self.perspective = perspective
+
+    def flip(self):
+        self.perspective = "b" if self.perspective == "w" else "w"
+
+    def rect(self, square : int):
+        """The pixel rect of a square"""
+        file, rank = square % 8, square // 8
+        x, y = (file, 7 - rank) if self.perspective == "w" else (7 - file, rank)
+        return pg.Rect(self.origin[0] + x * self.tile_size, self.origin[1] + y * self.tile_size, self.tile_size, self.tile_size)
+
+    def center(self, square : int):
+        return self.rect(square).center
+
+    def square_at(self, pos):
+        """The square under a pixel position, None outside the board"""
+        x = int((pos[0] - self.origin[0]) // self.tile_size)
+        y = int((pos[1] - self.origin[1]) // self.tile_size)
+        if not (0 <= x < 8 and 0 <= y < 8):
+            return None
+        return (7 - y) * 8 + x if self.perspective == "w" else y * 8 + 7 - x
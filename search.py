@@ -0,0 +1,523 @@
+# Built-in chess engine: iterative deepening principal variation search over position.Position with a
+# Zobrist keyed transposition table, killer/history move ordering and a quiescence search. It runs in
+# process, so the AI works without any external engine binary.
+#
+#   python search.py --workers 4 --movetime 5     compare 1 and 4 search processes (depth, nps, speedup)
+import ctypes
+import os
+import sys
+import time
+
+from position import Position, START_FEN
+
+INFINITY = 1000000
+MATE = 100000
+MATE_BOUND = MATE - 1000 # scores beyond this are mates, stored relative to the node in the transposition table
+MAX_PLY = 128
+
+EXACT, LOWER, UPPER = 0, 1, 2 # transposition table bound types
+
+PIECE_VALUES = {"p" : 100, "n" : 320, "b" : 330, "r" : 500, "q" : 900, "k" : 0}
+
+# piece-square tables from white's point of view, written rank 8 first like a board diagram
+_PAWN = (0, 0, 0, 0, 0, 0, 0, 0,
+         50, 50, 50, 50, 50, 50, 50, 50,
+         10, 10, 20, 30, 30, 20, 10, 10,
+         5, 5, 10, 25, 25, 10, 5, 5,
+         0, 0, 0, 20, 20, 0, 0, 0,
+         5, -5, -10, 0, 0, -10, -5, 5,
+         5, 10, 10, -20, -20, 10, 10, 5,
+         0, 0, 0, 0, 0, 0, 0, 0)
+_KNIGHT = (-50, -40, -30, -30, -30, -30, -40, -50,
+           -40, -20, 0, 0, 0, 0, -20, -40,
+           -30, 0, 10, 15, 15, 10, 0, -30,
+           -30, 5, 15, 20, 20, 15, 5, -30,
+           -30, 0, 15, 20, 20, 15, 0, -30,
+           -30, 5, 10, 15, 15, 10, 5, -30,
+           -40, -20, 0, 5, 5, 0, -20, -40,
+           -50, -40, -30, -30, -30, -30, -40, -50)
+_BISHOP = (-20, -10, -10, -10, -10, -10, -10, -20,
+           -10, 0, 0, 0, 0, 0, 0, -10,
+           -10, 0, 5, 10, 10, 5, 0, -10,
+           -10, 5, 5, 10, 10, 5, 5, -10,
+           -10, 0, 10, 10, 10, 10, 0, -10,
+           -10, 10, 10, 10, 10, 10, 10, -10,
+           -10, 5, 0, 0, 0, 0, 5, -10,
+           -20, -10, -10, -10, -10, -10, -10, -20)
+_ROOK = (0, 0, 0, 0, 0, 0, 0, 0,
+         5, 10, 10, 10, 10, 10, 10, 5,
+         -5, 0, 0, 0, 0, 0, 0, -5,
+         -5, 0, 0, 0, 0, 0, 0, -5,
+         -5, 0, 0, 0, 0, 0, 0, -5,
+         -5, 0, 0, 0, 0, 0, 0, -5,
+         -5, 0, 0, 0, 0, 0, 0, -5,
+         0, 0, 0, 5, 5, 0, 0, 0)
+_QUEEN = (-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20)
+_KING = (-30, -40, -40, -50, -50, -40, -40, -30,
+         -30, -40, -40, -50, -50, -40, -40, -30,
+         -30, -40, -40, -50, -50, -40, -40, -30,
+         -30, -40, -40, -50, -50, -40, -40, -30,
+         -20, -30, -30, -40, -40, -30, -30, -20,
+         -10, -20, -20, -20, -20, -20, -20, -10,
+         20, 20, 0, 0, 0, 0, 20, 20,
+         20, 30, 10, 0, 0, 10, 30, 20)
+_KING_ENDGAME = (-50, -40, -30, -20, -20, -30, -40, -50,
+                 -30, -20, -10, 0, 0, -10, -20, -30,
+                 -30, -10, 20, 30, 30, 20, -10, -30,
+                 -30, -10, 30, 40, 40, 30, -10, -30,
+                 -30, -10, 30, 40, 40, 30, -10, -30,
+                 -30, -10, 20, 30, 30, 20, -10, -30,
+                 -30, -30, 0, 0, 0, 0, -30, -30,
+                 -50, -30, -30, -30, -30, -30, -30, -50)
+
+def _square_scores(table, value):
+    """Per square score of a white and a black piece (black's is negated so a position sums to white's advantage)"""
+    white = [value + table[(7 - square // 8) * 8 + square % 8] for square in range(64)]
+    black = [-(value + table[(square // 8) * 8 + square % 8]) for square in range(64)]
+    return white, black
+
+SQUARE_SCORES = {}
+for _code, _table in (("p", _PAWN), ("n", _KNIGHT), ("b", _BISHOP), ("r", _ROOK), ("q", _QUEEN), ("k", _KING)):
+    SQUARE_SCORES[_code.upper()], SQUARE_SCORES[_code] = _square_scores(_table, PIECE_VALUES[_code])
+KING_ENDGAME_SCORES = dict(zip("Kk", _square_scores(_KING_ENDGAME, 0)))
+
+ENDGAME_MATERIAL = 1300 # non pawn material per side at or below which kings head for the center
+
+def evaluate(position):
+    """Static evaluation in centipawns from the side to move's point of view (material and piece placement)"""
+    score = 0
+    material = {"w" : 0, "b" : 0}
+    kings = {}
+    for square, code in enumerate(position.squares):
+        if code is None:
+            continue
+        if code == "K" or code == "k":
+            kings[code] = square
+            continue
+        score += SQUARE_SCORES[code][square]
+        if code not in "Pp":
+            material["w" if code.isupper() else "b"] += PIECE_VALUES[code.lower()]
+
+    tables = KING_ENDGAME_SCORES if max(material.values()) <= ENDGAME_MATERIAL else SQUARE_SCORES
+    for code, square in kings.items():
+        score += tables[code][square]
+    return score if position.turn == "w" else -score
+
+class SearchStopped(Exception):
+    """Raised inside the search when the time or node limit is reached"""
+
+class TranspositionTable():
+    """Fixed size hash table of search results indexed by the low bits of the Zobrist key
+
+    A slot is replaced when it's empty, holds the same position, was written by an earlier search
+    or was searched less deep than the new result (depth preferred with aging).
+
+    Args:
+        size (int, optional): number of slots, rounded down to a power of two. Defaults to 2 ** 18.
+    """
+    def __init__(self, size=2 ** 18) -> None:
+        self.size = 1 << (size.bit_length() - 1)
+        self.mask = self.size - 1
+        self.slots = [None] * self.size # (key, depth, score, bound, move, generation)
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+    def get(self, key : int):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key : int, depth : int, score : int, bound : int, move : int):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            if move is None and entry is not None and entry[0] == key:
+                move = entry[4] # keep the best move of a shallower search of the same position
+            self.slots[index] = (key, depth, score, bound, move, self.generation)
+
+class SharedTranspositionTable(TranspositionTable):
+    """Transposition table in shared memory, so several search processes read each other's results
+
+    Slots are two 64 bit words (key ^ data, data) written without locks: a slot torn by two processes
+    writing at once fails the key check and reads as a miss. The generation is shared as well and only
+    advanced by the table's owner (the process that starts the searches).
+
+    Args:
+        size (int, optional): number of slots, rounded down to a power of two. Defaults to 2 ** 18.
+        shared (tuple, optional): (slots, generation) of an existing table to attach to. Defaults to None (allocates a new table).
+    """
+    def __init__(self, size=2 ** 18, shared=None) -> None:
+        self.size = 1 << (size.bit_length() - 1)
+        self.mask = self.size - 1
+        self.owner = shared is None
+        if shared is None:
+            import multiprocessing
+
+            shared = (multiprocessing.RawArray(ctypes.c_uint64, 2 * self.size), multiprocessing.RawValue(ctypes.c_uint8, 0))
+        self.slots, self._generation = shared
+
+    @property
+    def shared(self):
+        """What another process needs to attach to this table"""
+        return self.slots, self._generation
+
+    @property
+    def generation(self):
+        return self._generation.value
+
+    def new_search(self):
+        if self.owner:
+            self._generation.value = (self._generation.value + 1) & 63
+
+    def clear(self):
+        ctypes.memset(self.slots, 0, ctypes.sizeof(self.slots))
+
+    def get(self, key : int):
+        index = (key & self.mask) * 2
+        data = self.slots[index + 1]
+        if self.slots[index] ^ data != key:
+            return None
+        # data bits: move 0-15, score + 2 ** 31 16-47, depth 48-55, bound 56-57, generation 58-63
+        move = data & 0xFFFF
+        return (key, (data >> 48) & 0xFF, ((data >> 16) & 0xFFFFFFFF) - 2 ** 31, (data >> 56) & 3, move or None, data >> 58)
+
+    def put(self, key : int, depth : int, score : int, bound : int, move : int):
+        index = (key & self.mask) * 2
+        old = self.slots[index + 1]
+        same = self.slots[index] ^ old == key
+        if old and not same and old >> 58 == self.generation and depth < (old >> 48) & 0xFF:
+            return
+        if move is None and same:
+            move = old & 0xFFFF or None
+        data = (move or 0) | (score + 2 ** 31) << 16 | depth << 48 | bound << 56 | self.generation << 58
+        self.slots[index] = key ^ data
+        self.slots[index + 1] = data
+
+class Searcher():
+    """Iterative deepening alpha-beta (principal variation search) engine
+
+    Args:
+        tt_size (int, optional): number of transposition table slots. Defaults to 2 ** 18.
+    """
+    def __init__(self, tt_size=2 ** 18) -> None:
+        self.tt = TranspositionTable(tt_size)
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = {"w" : [0] * 4096, "b" : [0] * 4096} # quiet move (from, to) -> cutoff score
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.stop = None # multiprocessing.Event that ends the search early (set for parallel search workers)
+
+    def search(self, position, depth=64, movetime=None, nodes=None, callback=None, start_depth=1):
+        """Searches the position with iterative deepening until the depth, time or node limit is reached
+
+        Args:
+            position (position.Position): position to search, restored when the search returns
+            depth (int, optional): maximum depth in plies. Defaults to 64.
+            movetime (float, optional): time limit in seconds. Defaults to None (no limit).
+            nodes (int, optional): node limit. Defaults to None (no limit).
+            callback (callable, optional): called with the info dict of every completed iteration
+            start_depth (int, optional): first iteration to search, parallel helpers start deeper. Defaults to 1.
+
+        Returns:
+            dict: "move" (movegen encoded, None if there is no legal move), "score" (centipawns for the side to move),
+              "depth", "nodes", "time", "nps" and "pv" of the deepest completed iteration
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.deadline = start + movetime if movetime is not None else None
+        self.node_limit = nodes
+        self.tt.new_search()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        for table in self.history.values():
+            for index, value in enumerate(table):
+                table[index] = value // 8
+
+        moves = position.legal_moves()
+        info = {"move" : moves[0] if moves else None, "score" : 0, "depth" : 0, "nodes" : 0, "time" : 0.0, "nps" : 0, "pv" : []}
+        if not moves:
+            info["score"] = -MATE if position.is_check() else 0
+            return info
+
+        root_depth = len(position.stack)
+        for iteration in range(min(start_depth, depth), depth + 1):
+            try:
+                score = self._pvs(position, iteration, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                while len(position.stack) > root_depth:
+                    position.unmake_move()
+                break
+            elapsed = time.perf_counter() - start
+            pv = self._principal_variation(position, iteration)
+            info = {"move" : pv[0] if pv else info["move"], "score" : score, "depth" : iteration, "nodes" : self.nodes,
+                    "time" : elapsed, "nps" : int(self.nodes / elapsed) if elapsed > 0 else 0, "pv" : pv}
+            if callback is not None:
+                callback(info)
+            if abs(score) > MATE_BOUND:
+                break # a forced mate was found, deeper searches won't change the move
+            if self.deadline is not None and time.perf_counter() + elapsed > self.deadline:
+                break # the next iteration would most likely not finish
+        info["nodes"] = self.nodes
+        return info
+
+    def _check_limits(self):
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped
+        if not self.nodes & 1023:
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                raise SearchStopped
+            if self.stop is not None and self.stop.is_set():
+                raise SearchStopped
+
+    def _principal_variation(self, position, depth):
+        """Follows the best moves stored in the transposition table from the root"""
+        pv = []
+        for _ in range(depth):
+            entry = self.tt.get(position.key)
+            if entry is None or entry[4] is None or entry[4] not in position.legal_moves():
+                break
+            pv.append(entry[4])
+            position.make_move(entry[4])
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+    def _order(self, position, moves, tt_move, ply):
+        """Sorts moves: transposition table move, captures (most valuable victim, least valuable attacker),
+        promotions, killer moves, then quiet moves by history score"""
+        squares = position.squares
+        killers = self.killers[ply]
+        history = self.history[position.turn]
+        scores = {}
+        for move in moves:
+            from_square, to_square = move & 63, (move >> 6) & 63
+            victim = squares[to_square]
+            if move == tt_move:
+                scores[move] = 10000000
+            elif victim is not None:
+                scores[move] = 1000000 + 10 * PIECE_VALUES[victim.lower()] - PIECE_VALUES[squares[from_square].lower()]
+            elif move >> 12:
+                scores[move] = 900000 + (move >> 12)
+            elif move == killers[0]:
+                scores[move] = 800000
+            elif move == killers[1]:
+                scores[move] = 700000
+            else:
+                scores[move] = history[move & 4095]
+        moves.sort(key=scores.__getitem__, reverse=True)
+        return moves
+
+    def _pvs(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        self._check_limits()
+
+        if ply > 0:
+            if position.half_moves >= 100 or position.repetitions.get(position.key, 0) > 1:
+                return 0
+            # mate distance pruning, no line can be better than mating right now
+            alpha, beta = max(alpha, -MATE + ply), min(beta, MATE - ply - 1)
+            if alpha >= beta:
+                return alpha
+
+        in_check = position.is_check()
+        if in_check:
+            depth += 1 # check extension
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+
+        key = position.key
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score = _from_tt(entry[2], ply)
+                bound = entry[3]
+                if bound == EXACT or (bound == LOWER and score >= beta) or (bound == UPPER and score <= alpha):
+                    return score
+
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE + ply if in_check else 0
+
+        original_alpha = alpha
+        best_score, best_move = -INFINITY, None
+        for index, move in enumerate(self._order(position, moves, tt_move, ply)):
+            quiet = position.squares[(move >> 6) & 63] is None and not move >> 12
+            position.make_move(move)
+            if index == 0:
+                score = -self._pvs(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # null window search, re-searched with the full window if it beats alpha
+                score = -self._pvs(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._pvs(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet and ply < MAX_PLY:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[0], killers[1] = move, killers[0]
+                            self.history[position.turn][move & 4095] += depth * depth
+                        break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.tt.put(key, depth, _to_tt(best_score, ply), bound, best_move)
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        """Searches captures and promotions only, so positions are evaluated when they are quiet"""
+        self.nodes += 1
+        self._check_limits()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        squares = position.squares
+        en_passant = position.en_passant
+        tactical = []
+        for move in position.legal_moves():
+            to_square = (move >> 6) & 63
+            if squares[to_square] is not None or move >> 12 or (to_square == en_passant and squares[move & 63] in ("P", "p")):
+                tactical.append(move)
+
+        for move in self._order(position, tactical, None, ply):
+            position.make_move(move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+def _to_tt(score, ply):
+    """Mate scores are stored as distance from the node instead of from the root"""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def _from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+_worker_searcher = None # the Searcher of a parallel search worker process
+
+def _init_worker(tt_size, shared, stop):
+    global _worker_searcher
+    _worker_searcher = Searcher(tt_size=2)
+    _worker_searcher.tt = SharedTranspositionTable(tt_size, shared)
+    _worker_searcher.stop = stop
+
+def _worker_search(fen, repetitions, depth, movetime, nodes, index):
+    position = Position(fen)
+    position.repetitions = repetitions
+    # helpers start one iteration deeper every other worker, so they don't all search the same tree in lockstep
+    return _worker_searcher.search(position, depth, movetime, nodes, start_depth=1 + index % 2)
+
+class ParallelSearcher():
+    """Lazy SMP search: every worker process searches the same position with iterative deepening, sharing one
+    transposition table in shared memory. Workers fill the table for each other, so the first worker (the one
+    whose result counts unless a helper finished a deeper iteration) reaches a given depth sooner.
+
+    Args:
+        workers (int, optional): number of search processes. Defaults to the number of cores.
+        tt_size (int, optional): number of shared transposition table slots. Defaults to 2 ** 20.
+    """
+    def __init__(self, workers=None, tt_size=2 ** 20) -> None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers or os.cpu_count() or 1
+        self.tt = SharedTranspositionTable(tt_size)
+        self._stop = multiprocessing.Event()
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.tt.size, self.tt.shared, self._stop))
+
+    def search(self, position, depth=64, movetime=None, nodes=None, callback=None):
+        """Same arguments and result as Searcher.search (nodes limits every worker, the callback gets the final info only)"""
+        start = time.perf_counter()
+        self.tt.new_search()
+        self._stop.clear()
+        fen, repetitions = position.fen(), dict(position.repetitions)
+        futures = [self._pool.submit(_worker_search, fen, repetitions, depth, movetime, nodes, index) for index in range(self.workers)]
+        results = [futures[0].result()]
+        self._stop.set() # the main worker is done, helpers stop at their next limit check
+        results.extend(future.result() for future in futures[1:])
+
+        elapsed = time.perf_counter() - start
+        info = dict(max(results, key=lambda result: result["depth"])) # ties go to the main worker
+        info["nodes"] = sum(result["nodes"] for result in results)
+        info["time"] = elapsed
+        info["nps"] = int(info["nodes"] / elapsed) if elapsed > 0 else 0
+        if callback is not None:
+            callback(info)
+        return info
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+def benchmark(fen : str, movetime : float, workers : int):
+    """Compares one search process with `workers` of them on a position
+
+    Returns:
+        dict: depth reached in the time budget by each, nps of each and the time to depth speedup
+    """
+    single = Searcher(tt_size=2 ** 20).search(Position(fen), movetime=movetime)
+    parallel = ParallelSearcher(workers)
+    try:
+        parallel.search(Position(fen), depth=1) # starts the worker processes
+        parallel.tt.clear()
+        to_depth = parallel.search(Position(fen), depth=single["depth"])
+        parallel.tt.clear()
+        timed = parallel.search(Position(fen), movetime=movetime)
+    finally:
+        parallel.close()
+    return {"single depth" : single["depth"], "single nps" : single["nps"], "parallel depth" : timed["depth"],
+            "parallel nps" : timed["nps"], "speedup" : single["time"] / to_depth["time"] if to_depth["time"] else 0.0}
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Built-in engine search and parallel speedup benchmark")
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--movetime", type=float, default=5.0, help="seconds per search")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="search processes of the parallel search")
+    args = parser.parse_args(argv)
+
+    result = benchmark(args.fen, args.movetime, args.workers)
+    print(f"1 worker:  depth {result['single depth']}  {result['single nps']} nodes/s")
+    print(f"{args.workers} workers: depth {result['parallel depth']}  {result['parallel nps']} nodes/s")
+    print(f"time to depth {result['single depth']} speedup: {result['speedup']:.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,57 +1,73 @@
-import chess
-import chess.engine
+import pygame as pg
 from player import *
 import piece
+import movegen
+import state
+import render
 
-class Board():
+class Board(state.BoardState):
     def __init__(self, fen : str, play_as : str, ai, depth, tile_size=100) -> None:
-        """Holds the information about the game
+        """Holds the information about the game, the display-free parts live in state.BoardState
 
         Args:
             fen (str): FEN string to generate the game position
             play_as (str): "w" or "b" determines which side the human/main player plays on
-            ai (bool): True if players wants to play vs AI else False
+            ai (bool or type): True if players wants to play vs AI (Stockfish) else False, or the Player class (or factory) of the AI (e.g. SearchAI)
             depth (int): AI Move calculation depth. Defaults to 10.
             tile_size (int, optional): the size of each side of the board's squares. Defaults to 100.
         """
-        # display surface of the board
-        self.tile_size = tile_size
-        self.GAME_SURFACE_SIZE = 8 * tile_size
-        
-        self.game_surface = pg.Surface((self.GAME_SURFACE_SIZE, self.GAME_SURFACE_SIZE))
-        self.game_rect = self.game_surface.get_rect(center=((self.GAME_SURFACE_SIZE / 2) * 1.7, (self.GAME_SURFACE_SIZE / 2) * 1.2))
-        
-        
-        # computer's internal representation of the board
-        self.GRID = [[pg.Rect(self.game_rect.left + (x * self.tile_size) ,self.game_rect.top + (y * self.tile_size)
-                              , self.tile_size, self.tile_size) for x in range(8)] for y in range(8)]
+        # display surface of the board and the view mapping its squares to pixels (the only perspective dependent part)
+        self.view = render.View(tile_size, (0, 0), play_as)
+        self.layout(tile_size)
         
         # managing pieces
         self.pieces = {"black" : pg.sprite.Group(), "white" : pg.sprite.Group()}
         self.w_king = self.b_king = None
-        self.en_passant = "-"
-        
-
-        # board conditions
-        self.to_move = "w"
-        self.board_perspective = play_as
-        self.half_moves = 0
-        self.full_moves = 1
-        self.running = True
 
         # organizing board
-        self.square_dict = {}
         self.occ_squares = {}
-        self.font = pg.font.Font("pieces/Philosopher-Regular.ttf", int(20 * (self.tile_size/100)))
 
-        # player instances and init game
+        # player instances and init game (load_fen places the pieces and creates the players)
         self.player_1 = self.player_2 = None
-        self.ai_depth = depth
         self.ai = ai
-        self.current_fen = self.load_fen(fen, play_as, ai)
-        self.game_positions = [self.current_fen]
-        self.position_analysis = self.analyze_position(self.current_fen, depth)[1]
-        self.game_position_index = -1
+        super().__init__(fen, depth)
+        self.request_analysis()
+
+    @property
+    def board_perspective(self):
+        """"w" or "b", the side shown at the bottom of the view"""
+        return self.view.perspective
+
+    def layout(self, tile_size : int):
+        """Computes the board surface, square rects and coordinate font for a tile size
+
+        Args:
+            tile_size (int): the size of each side of the board's squares
+        """
+        self.tile_size = tile_size
+        self.GAME_SURFACE_SIZE = 8 * tile_size
+        
+        self.game_surface = pg.Surface((self.GAME_SURFACE_SIZE, self.GAME_SURFACE_SIZE))
+        self.game_rect = self.game_surface.get_rect(center=((self.GAME_SURFACE_SIZE / 2) * 1.7, (self.GAME_SURFACE_SIZE / 2) * 1.2))
+        
+        self.GRID = [[pg.Rect(self.game_rect.left + (x * self.tile_size) ,self.game_rect.top + (y * self.tile_size)
+                              , self.tile_size, self.tile_size) for x in range(8)] for y in range(8)]
+        self.view.tile_size = tile_size
+        self.view.origin = self.game_rect.topleft
+        self.font = render.text_cache.font("pieces/Philosopher-Regular.ttf", int(20 * (self.tile_size/100)))
+
+    def set_tile_size(self, tile_size : int):
+        """Resizes the board in place: only the layout and the piece images (from the sprite atlas) change,
+        the position, history, players and the last analysis are kept and no engine work is started
+
+        Args:
+            tile_size (int): the new size of each side of the board's squares
+        """
+        self.layout(tile_size)
+        for group in self.pieces.values():
+            for inst in group:
+                inst.image = render.atlas.image(inst.color, inst.icon, tile_size)
+                inst.rect = inst.image.get_rect(center=inst.rect.center) # placed on the new grid at draw time
 
     def row_col_display(self, display):
         """Displays the board coordinates
@@ -111,208 +127,137 @@ class Board():
         
         self.row_col_display(display) 
 
-    def flip_board(self):
-        """Flips the game board
-        """
-        if self.board_perspective == "w":
-            self.square_dict = self.gen_dict(white_side=False)
-            self.board_perspective = "b"
-        else:
-            self.square_dict = self.gen_dict()      
-            self.board_perspective = "w"
-        for val in self.pieces.values():
-            for piece in val:
-                piece.rect.center = self.square_dict[piece.square].center        
-    
-    def gen_dict(self, white_side=True):
-        """Creates a dictionary with the board cord as a key and the pg.rect obj as the value
-
-        Args:
-            white_side(bool, optional): if the main player is playing white pieces
-
-        Returns:
-            dictionary
-        """
-        dic = {}
-        if white_side:
-            y_axis = 8
-            x_axis = 97 
-            for y in range(8):
-                for x in range(8):
-                    dic[f"{chr(x_axis)}{y_axis}"] = self.GRID[y][x]
-                    x_axis += 1
-                x_axis = 97    
-                y_axis -= 1
-            self.board_perspective = "w"    
-        else:
-            y_axis = 1
-            x_axis = 104
-            for y in range(8):
-                for x in range(8):
-                    dic[f"{chr(x_axis)}{y_axis}"] = self.GRID[y][x]
-                    x_axis -= 1
-                x_axis = 104  
-                y_axis += 1 
-            self.board_perspective = "b"        
-        return dic  
-    
-    def analyze_position(self, fen: str, depth: int):
-        """Stockfish's analysis of the current game position
+    def square_at(self, pos):
+        """The square (movegen index) under a pixel position, None outside the board
 
         Args:
-            fen (str): FEN string representing the current game position
-            depth (int): The depth which Stockfish calculates positions to
-
-        Returns:
-            tuple: best move, evaluation
+            pos (tuple): (x, y) pixel position on the display
         """
-        try:
-            board = chess.Board(fen=fen)
+        return self.view.square_at(pos)
 
-            with chess.engine.SimpleEngine.popen_uci(["stockfish/stockfish-windows-x86-64-modern.exe"]) as engine:
-                info = engine.analyse(board, chess.engine.Limit(depth=depth))
-
-                best_move = info.get("pv")[0]
-                evaluation = info.get("score").relative.score() / 100
-
-                return best_move, evaluation
-        except Exception as e:
-            return str(e)   
-
-    def game_over(self, fen : str):
-        """Checks if the game is over
-
-        Args:
-            fen (str): FEN string representing current position
-
-        Returns:
-            bool or None: 1 if game result is checkmate, 0 if stalemate, None if game hasn't concluded
+    def flip_board(self):
+        """Flips the game board (only the view changes, sprites are placed for it at draw time)
         """
-        try:
-            board = chess.Board(fen=fen)
-            if board.is_checkmate():
-                return 1
-            elif board.is_stalemate():
-                return 0
-            else:
-                return None
-        except Exception:
-            return None
-    
-    def is_valid_position(self, fen : str):
-        """Checks wether the FEN string is valid
-
-        Args:
-            fen (str): _description_
+        self.view.flip()
 
-        Returns:
-            _type_: _description_
-        """
-        try:
-            chess.Board(fen=fen)    
-            return True
-        except ValueError:
-            print(fen)
-            return False 
+    def place_sprites(self):
+        """Positions the piece sprites on their squares in the view. A piece a player is dragging follows the cursor instead."""
+        dragged = [getattr(player, "pressed", None) for player in (self.player_1, self.player_2)]
+        for group in self.pieces.values():
+            for inst in group:
+                if inst not in dragged:
+                    inst.rect.center = self.view.center(movegen.SQUARE_INDEX[inst.square])
 
     def reset_board(self):
-        self.square_dict = {}
         self.occ_squares = {}
         self.pieces["white"].empty()
         self.pieces["black"].empty()
     
-    def load_fen(self, fen : str, play_as : str, ai : bool):
+    def load_fen(self, fen : str, play_as : str = None, ai = None):
         """Reads a fen string and places the pieces on the board accordingly
 
         Args:
             fen (str): a string format that the function interperates as locations on the board and what piece are to be placed.
-            play_as (str): which side the main player plays as
-            ai (bool): If the player chooses to play vs AI
+            play_as (str, optional): which side the main player plays as. Defaults to the side at the bottom of the view.
+            ai (bool or type, optional): If the player chooses to play vs AI, or the Player class of the AI. Defaults to the board's ai.
 
-        Raises:
-            Exception: if the fen string if invalid
+        Returns:
+            str: the loaded FEN
         """
-        pieces = {"r" : piece.Rook, "n" : piece.Knight, "b" : piece.Bishop, "k" : piece.King, 
-                  "q" : piece.Queen, "p" : piece.Pawn}
+        try:
+            fen = super().load_fen(fen)
+        except ValueError as e:
+            print(f"FEN is not valid! please make sure the fen provided to load is correct. ({e})")
+            exit(1)
+        play_as = play_as or self.board_perspective
+        ai = self.ai if ai is None else ai
 
-        if fen is None:
-            fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+        self.player_1 = Human(play_as, self) 
+        opponent = (ai if callable(ai) else AI) if ai else Human
+        self.player_2 = opponent("b" if play_as == "w" else "w", self)
 
-        if self.is_valid_position(fen) == False:
-            print("FEN is not valid! please make sure the fen provided to load is correct.")
-            exit(1)    
+        self.reset_board()
+        self.sync_sprites()
+        return fen
 
-        x = 97
-        y = 8
+    def goto_ply(self, ply : int):
+        """Shows another position of the game line by taking back or replaying the moves in between
+        on the live position, then moves, adds or removes only the sprites that differ
 
-        fen = fen.split(" ")
+        Args:
+            ply (int): number of moves from the loaded position
 
-        self.to_move = fen[1]
-        self.player_1 = Human(play_as, self) 
-        self.player_2 = AI("b" if play_as == "w" else "w", self) if ai else Human("b" if play_as == "w" else "w", self)
-        self.square_dict = self.gen_dict()         
-        
-        for i in fen[0]:
-            if i.isdecimal():
-                x += int(i)
-            elif i.isalpha():
-                if i.islower():
-                    inst = pieces[i](f"{chr(x)}{y}", self, "Black")
-                    self.pieces["black"].add(inst) 
-                    self.occ_squares[f"{chr(x)}{y}"] = inst 
-                    if i == "k":
-                        self.b_king = inst
-                else:   
-                    inst = pieces[i.lower()](f"{chr(x)}{y}", self, "White")
-                    self.pieces["white"].add(inst) 
-                    self.occ_squares[f"{chr(x)}{y}"] = inst    
-                    if i == "K":
-                        self.w_king = inst
-
-                x += 1   
+        Returns:
+            bool: False if the game line has no such position
+        """
+        if not super().goto_ply(ply):
+            return False
+        self.sync_sprites()
+        return True
+
+    def sync_sprites(self):
+        """Matches the piece sprites to the logical position, reusing sprites that only changed square"""
+        moved = {} # piece code -> sprites whose square doesn't hold their piece anymore
+        for key, inst in list(self.occ_squares.items()):
+            if self.position.squares[movegen.SQUARE_INDEX[key]] != inst.code:
+                moved.setdefault(inst.code, []).append(self.occ_squares.pop(key))
+
+        for index, code in enumerate(self.position.squares):
+            key = movegen.SQUARE_NAMES[index]
+            if code is None or key in self.occ_squares:
+                continue
+            if moved.get(code):
+                inst = moved[code].pop()
             else:
-                y -= 1
-                x = 97     
+                inst = piece.PIECE_TYPES[code.lower()](key, self, "White" if code.isupper() else "Black")
+                self.pieces["white" if code.isupper() else "black"].add(inst)
+            inst.square = key
+            self.occ_squares[key] = inst
+            if code == "K":
+                self.w_king = inst
+            elif code == "k":
+                self.b_king = inst
+
+        for leftover in moved.values():
+            for inst in leftover:
+                inst.kill()
+
+        # a piece picked up by a player may be gone or on another square now
+        for player in (self.player_1, self.player_2):
+            if getattr(player, "pressed", None) is not None:
+                player.pressed.moves.clear()
+                player.pressed = None
+
+    def play_move(self, move : int):
+        """Plays a move on the logical position and mirrors it on the piece sprites
 
-        
-        self.w_king.castling["king"] = "K" if "K" in fen[2] else "-"
-        self.w_king.castling["queen"] = "Q" if "Q" in fen[2] else "-"   
-        
-        self.b_king.castling["king"] = "k" if "k" in fen[2] else "-"
-        self.b_king.castling["queen"] = "q" if "q" in fen[2] else "-"
-
-        self.enpassant = fen[3]
-        self.half_moves = fen[4]  
-        self.full_moves = fen[5]
-        
-        if self.game_over(" ".join(fen)) != None:
-            self.running = False
-        return " ".join(fen)      
-
-    def gen_fen(self):
-        """Generates a fen string from the current board conditions"""
-        string = []
-        for y in reversed(range(1,9)):
-            i = 0
-            for x in range(97,105):
-                if f"{chr(x)}{y}" in self.occ_squares:  
-                    if i != 0:
-                        string.append(str(i))
-                    string.append(self.occ_squares[f"{chr(x)}{y}"].code)
-                    i = 0
-                else:
-                    i += 1 
-            if i != 0:
-                string.append(str(i))        
-            string.append('/') 
-        string.pop(-1)        
-        
-        castling_rights = [self.w_king.castling["king"], self.w_king.castling["queen"], self.b_king.castling["king"], self.b_king.castling["queen"]]
-        castling_rights = ''.join(castling_rights).strip("-")
-        if castling_rights == "":
-            castling_rights = "-"
-        string.append(f' {self.to_move} {castling_rights} {self.en_passant} {self.half_moves} {self.full_moves}')            
-        
-        return ''.join(string)  
-              
-              
\ No newline at end of file
+        Args:
+            move (int): movegen encoded move
+        """
+        from_square, to_square = movegen.move_from(move), movegen.move_to(move)
+        key = movegen.SQUARE_NAMES[to_square]
+        inst = self.occ_squares.pop(movegen.SQUARE_NAMES[from_square])
+        group = self.pieces["white"] if inst.color == "White" else self.pieces["black"]
+
+        self.position.make_move(move)
+        captured, captured_square = self.position.stack[-1][1:3]
+
+        # Capturing a piece (the captured square differs from the target on en passant)
+        if captured is not None:
+            self.occ_squares.pop(movegen.SQUARE_NAMES[captured_square]).kill()
+
+        # Castling
+        if isinstance(inst, piece.King) and abs(to_square - from_square) == 2:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            rook = self.occ_squares.pop(movegen.SQUARE_NAMES[rook_from])
+            rook.square = movegen.SQUARE_NAMES[rook_to]
+            self.occ_squares[rook.square] = rook
+
+        # Promotion
+        if movegen.move_promotion(move):
+            inst.kill()
+            inst = piece.PIECE_TYPES[movegen.PROMOTION_CODES[movegen.move_promotion(move)]](key, self, inst.color)
+            group.add(inst)
+
+        inst.square = key
+        self.occ_squares[key] = inst
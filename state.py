@@ -0,0 +1,302 @@
+# Display-free game state: the position, the game line, game over checks and the background analysis.
+# setup.Board draws on top of it, workers and tools use it directly. Importing it loads neither pygame
+# nor python-chess (FENs are checked by the position itself, the engine is only imported when it's first used).
+#
+#   python state.py --runs 20     cold start: fresh interpreter to a constructed position, in milliseconds
+import os
+import sys
+import time
+
+import engine
+import history
+import movegen
+import position
+import tablebase
+
+class BoardState():
+    def __init__(self, fen : str = None, depth=10) -> None:
+        """Holds the logical side of a game, nothing here needs a display
+
+        Args:
+            fen (str, optional): FEN string to generate the game position. Defaults to the start position.
+            depth (int, optional): AI move calculation and analysis depth. Defaults to 10.
+
+        Raises:
+            ValueError: if the FEN is malformed
+        """
+        # board conditions (side to move, castling, en passant and move counters live in the logical position)
+        self.position = position.Position()
+        self.running = True
+        self.ai_depth = depth
+        self.current_fen = self.load_fen(fen)
+        self.history = history.GameHistory(self.current_fen) # the game line, stepped through on the live position when traversing
+
+        # engine results arrive asynchronously, they're only applied while they match current_fen
+        self._analyzer = None
+        self.position_analysis = "..."
+        self.best_move = None
+        self.analysis_fen = self.pending_analysis = None
+
+    @property
+    def analyzer(self):
+        """The background analyzer, started on first use so a state that is never analysed never starts an engine"""
+        if self._analyzer is None:
+            self._analyzer = engine.get_analyzer()
+        return self._analyzer
+
+    @property
+    def to_move(self):
+        return self.position.turn
+
+    @property
+    def en_passant(self):
+        return movegen.SQUARE_NAMES[self.position.en_passant] if self.position.en_passant is not None else "-"
+
+    @property
+    def zobrist_key(self):
+        """64 bit Zobrist key of the current position, kept up to date incrementally on every move"""
+        return self.position.key
+
+    @property
+    def ply(self):
+        """Number of moves between the loaded position and the one on the board"""
+        return len(self.position.stack)
+
+    @property
+    def half_moves(self):
+        return self.position.half_moves
+
+    @property
+    def full_moves(self):
+        return self.position.full_moves
+
+    def analyze_position(self, fen: str, depth: int):
+        """Stockfish's analysis of the current game position
+
+        Args:
+            fen (str): FEN string representing the current game position
+            depth (int): The depth which Stockfish calculates positions to
+
+        Returns:
+            tuple: best move, evaluation
+        """
+        try:
+            known = self.tablebase_analysis(fen)
+            if known is not None:
+                return known
+
+            import chess.engine
+
+            cache = engine.get_cache()
+            cached = cache.get(fen, depth)
+            if cached is not None:
+                return cached
+
+            # warm engine from the shared pool instead of spawning Stockfish for every call
+            info = engine.get_pool().analyse(fen, chess.engine.Limit(depth=depth))
+            cache.put_info(fen, info)
+            return engine.summarize(info)
+        except Exception as e:
+            return None, str(e)
+
+    def request_analysis(self):
+        """Queues a background analysis of the current position unless it's already analyzed or pending"""
+        if self.current_fen in (self.analysis_fen, self.pending_analysis):
+            return
+        known = self.tablebase_analysis(self.current_fen)
+        if known is not None: # exact, no engine needed
+            self.best_move, self.position_analysis = known
+            self.analysis_fen, self.pending_analysis = self.current_fen, None
+            return
+        self.position_analysis = "..."
+        self.best_move = None
+        self.pending_analysis = self.current_fen
+        self.analyzer.submit(self.current_fen, self.ai_depth)
+
+    def tablebase_analysis(self, fen : str):
+        """The tablebase result of a position with few enough pieces
+
+        Returns:
+            tuple or None: best move (UCI), evaluation text, None without tables covering the position
+        """
+        tablebases = tablebase.get_tablebases()
+        if tablebases is None:
+            return None
+        try:
+            return tablebases.analysis(fen)
+        except Exception: # a broken table file, the engine takes over
+            return None
+
+    def poll_analysis(self):
+        """Applies finished background analysis results, results for outdated positions are dropped"""
+        if self._analyzer is None:
+            return
+        for fen, (best_move, evaluation) in self.analyzer.poll():
+            if fen == self.current_fen:
+                self.best_move = best_move
+                self.position_analysis = evaluation
+                self.analysis_fen = fen
+                self.pending_analysis = None
+
+    def game_over(self, fen : str):
+        """Checks if the game is over
+
+        Args:
+            fen (str): FEN string representing current position
+
+        Returns:
+            bool or None: 1 if game result is checkmate, 0 if stalemate, 2 if the position occurred for the third time,
+              None if game hasn't concluded
+        """
+        try:
+            live = fen == self.gen_fen() # repetitions are only known for the live position
+            board = self.position if live else position.Position(fen)
+            if not board.legal_moves():
+                return 1 if board.is_check() else 0
+            elif live and board.is_repetition():
+                return 2
+            else:
+                return None
+        except Exception:
+            return None
+
+    def is_valid_position(self, fen : str):
+        """Checks wether the FEN string is valid
+
+        Args:
+            fen (str): FEN string to check
+
+        Returns:
+            bool: True if the FEN can be loaded
+        """
+        try:
+            position.Position(fen)
+            return True
+        except ValueError:
+            return False
+
+    def load_fen(self, fen : str):
+        """Sets the position from a FEN string
+
+        Args:
+            fen (str): FEN string, None for the start position
+
+        Raises:
+            ValueError: if the FEN is malformed (the position is left as it was)
+
+        Returns:
+            str: the loaded FEN
+        """
+        if fen is None:
+            fen = position.START_FEN
+
+        self.position.set_fen(fen)
+        if self.game_over(fen) != None:
+            self.running = False
+        return fen
+
+    def gen_fen(self):
+        """Generates a fen string from the current board conditions"""
+        return self.position.fen()
+
+    def castling_rights(self):
+        """Current castling rights in FEN notation ("KQkq", "Kq", "-", ...)"""
+        return self.position.castling
+
+    def mailbox(self):
+        """The board as a 64 entry list of piece codes indexed by movegen square index (a1 = 0, h8 = 63)"""
+        return self.position.squares
+
+    def make_move(self, move : int):
+        """Plays a move on the logical position only (no sprites are touched)
+
+        Args:
+            move (int): movegen encoded move
+        """
+        self.position.make_move(move)
+
+    def unmake_move(self):
+        """Takes back the last move made with make_move, restoring the position from the undo stack
+
+        Returns:
+            int: the move that was taken back
+        """
+        return self.position.unmake_move()
+
+    def play_move(self, move : int):
+        """Plays a move of the game (setup.Board also moves the sprites)
+
+        Args:
+            move (int): movegen encoded move
+        """
+        self.position.make_move(move)
+
+    def record_move(self):
+        """Adds the move just played to the game line. When it was played from an earlier position
+        the moves that followed that position are dropped."""
+        ply = self.ply
+        if ply - 1 < len(self.history):
+            self.history = self.history.fork(ply - 1)
+        self.current_fen = self.gen_fen()
+        self.history.append(self.position.stack[-1][0], self.current_fen)
+
+    def goto_ply(self, ply : int):
+        """Goes to another position of the game line by taking back or replaying the moves in between
+        on the live position
+
+        Args:
+            ply (int): number of moves from the loaded position
+
+        Returns:
+            bool: False if the game line has no such position
+        """
+        if not 0 <= ply <= len(self.history):
+            return False
+        while self.ply > ply:
+            self.position.unmake_move()
+        while self.ply < ply:
+            self.position.make_move(self.history.move(self.ply))
+        self.current_fen = self.gen_fen()
+        return True
+
+def cold_start(code : str, runs : int):
+    """Times a snippet in fresh interpreters, interpreter start included
+
+    Returns:
+        float: median wall time in milliseconds, None if the snippet fails (e.g. pygame isn't installed)
+    """
+    import subprocess
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        if subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).returncode:
+            return None
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[len(times) // 2]
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cold start time of the display-free game state")
+    parser.add_argument("--fen", default=position.START_FEN)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per measurement")
+    args = parser.parse_args(argv)
+
+    # the gap between the Position and the BoardState is the game line and the engine module (not the engine itself)
+    snippets = {"interpreter" : "pass",
+                "import position, Position(fen)" : f"import position; position.Position({args.fen!r})",
+                "import state, BoardState(fen)" : f"import state; state.BoardState({args.fen!r})",
+                "import setup (pygame)" : "import setup"}
+    baseline = None
+    for name, code in snippets.items():
+        median = cold_start(code, args.runs)
+        if median is None:
+            print(f"{name:32} failed")
+            continue
+        baseline = median if baseline is None else baseline
+        print(f"{name:32} {median:7.1f} ms  (+{median - baseline:.1f} ms over the interpreter)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
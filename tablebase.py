@@ -0,0 +1,172 @@
+# Syzygy endgame tablebases. Positions with few enough pieces are looked up instead of searched: the result
+# (WDL) and the distance to the next capture or pawn move (DTZ) are exact, so endgame replies are instant and
+# never misplayed. python-chess's prober memory maps the table files, opens them lazily on first probe and
+# keeps at most max_fds of them open. Positions with more pieces than the largest table are rejected from the
+# FEN alone, before python-chess is even imported.
+#
+#   python tablebase.py syzygy --fen "<fen>"     WDL, DTZ and the best move of a position
+import os
+import sys
+import threading
+
+import movegen
+
+TABLEBASE_PATH = "syzygy"
+TABLE_SUFFIXES = (".rtbw", ".rtbz")
+
+WDL_NAMES = {2 : "win", 1 : "cursed win", 0 : "draw", -1 : "blessed loss", -2 : "loss"} # cursed and blessed results are draws by the 50 move rule
+
+class Tablebases():
+    """Syzygy tables in a directory, opened on first probe
+
+    Args:
+        path (str, optional): directory with the .rtbw (WDL) and .rtbz (DTZ) files. Defaults to TABLEBASE_PATH.
+        max_fds (int, optional): most table files kept open at once. Defaults to 64.
+    """
+    def __init__(self, path=TABLEBASE_PATH, max_fds=64) -> None:
+        self.path = path
+        self.max_fds = max_fds
+        # table names are the pieces of both sides ("KRPvKR"), the largest one sets how many pieces are covered
+        names = [os.path.splitext(name)[0] for name in os.listdir(path) if name.endswith(TABLE_SUFFIXES)] if os.path.isdir(path) else []
+        self.max_pieces = max((len(name) - 1 for name in names), default=0)
+        self._tablebase = None
+        self._lock = threading.Lock()
+
+    @property
+    def tablebase(self):
+        """The python-chess prober"""
+        if self._tablebase is None:
+            import chess.syzygy
+
+            with self._lock:
+                if self._tablebase is None:
+                    self._tablebase = chess.syzygy.open_tablebase(self.path, max_fds=self.max_fds)
+        return self._tablebase
+
+    def covers(self, fen : str):
+        """Checks whether a position is small enough for the tables (without castling rights, which tables don't know)"""
+        fields = fen.split()
+        return sum(char.isalpha() for char in fields[0]) <= self.max_pieces and fields[2] == "-"
+
+    def probe(self, fen : str):
+        """Looks a position up
+
+        Args:
+            fen (str): FEN string of the position
+
+        Returns:
+            tuple or None: (WDL, DTZ) from the side to move's view (DTZ None without a DTZ table), None if not covered
+        """
+        if not self.covers(fen):
+            return None
+        import chess
+
+        board = chess.Board(fen)
+        tablebase = self.tablebase
+        with self._lock:
+            wdl = tablebase.get_wdl(board)
+            dtz = tablebase.get_dtz(board) if wdl is not None else None
+        return (wdl, dtz) if wdl is not None else None
+
+    def best(self, fen : str):
+        """The move that keeps the best result: the quickest mate or zeroing move when winning, the longest
+        resistance when losing
+
+        Returns:
+            tuple or None: (movegen encoded move, WDL, DTZ of the position), None if not covered
+        """
+        if not self.covers(fen):
+            return None
+        import chess
+
+        board = chess.Board(fen)
+        ranked = []
+        tablebase = self.tablebase
+        with self._lock:
+            wdl = tablebase.get_wdl(board)
+            if wdl is None:
+                return None
+            dtz = tablebase.get_dtz(board)
+            for move in board.legal_moves:
+                zeroing = board.is_zeroing(move)
+                board.push(move)
+                try:
+                    if board.is_checkmate():
+                        key = (-3, 0, 0)
+                    else:
+                        # results after the move are the opponent's, lower is better for us
+                        reply = tablebase.get_wdl(board)
+                        if reply is None:
+                            continue
+                        reply_dtz = abs(tablebase.get_dtz(board) or 0)
+                        key = (reply, 0 if zeroing else 1, reply_dtz) if reply < 0 else (reply, 0, -reply_dtz)
+                finally:
+                    board.pop()
+                ranked.append((key, move))
+        if not ranked:
+            return None
+        return movegen.uci_to_move(min(ranked, key=lambda entry: entry[0])[1].uci()), wdl, dtz
+
+    def choose(self, fen : str):
+        """The best move in a covered position (same use as book.OpeningBook.choose)
+
+        Returns:
+            int or None: movegen encoded move, None if the position isn't covered
+        """
+        found = self.best(fen)
+        return found[0] if found is not None else None
+
+    def analysis(self, fen : str):
+        """A covered position's result in the shape of an engine analysis
+
+        Returns:
+            tuple or None: (best move in UCI, evaluation text), None if the position isn't covered
+        """
+        found = self.best(fen)
+        if found is None:
+            return None
+        move, wdl, dtz = found
+        evaluation = f"tablebase {WDL_NAMES[wdl]}" + (f" (DTZ {abs(dtz)})" if wdl and dtz else "")
+        return movegen.move_to_uci(move), evaluation
+
+    def close(self):
+        with self._lock:
+            if self._tablebase is not None:
+                self._tablebase.close()
+                self._tablebase = None
+
+_tablebases = None
+_tablebases_lock = threading.Lock()
+
+def get_tablebases(path=None):
+    """The process-wide tablebases, None if there are no tables. Passing a path on first use picks the directory."""
+    global _tablebases
+    with _tablebases_lock:
+        if _tablebases is None:
+            tablebases = Tablebases(path or TABLEBASE_PATH)
+            _tablebases = tablebases if tablebases.max_pieces else False
+        return _tablebases or None
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Probe Syzygy tablebases")
+    parser.add_argument("path", nargs="?", default=TABLEBASE_PATH, help="directory with the table files")
+    parser.add_argument("--fen", required=True)
+    args = parser.parse_args(argv)
+
+    tablebases = Tablebases(args.path)
+    if not tablebases.covers(args.fen):
+        print(f"not covered (tables for up to {tablebases.max_pieces} pieces, no castling rights)")
+        return 1
+    found = tablebases.best(args.fen)
+    if found is None:
+        print("table missing")
+        return 1
+    move, wdl, dtz = found
+    print(f"{WDL_NAMES[wdl]}, DTZ {dtz}, best move {movegen.move_to_uci(move)}")
+    tablebases.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
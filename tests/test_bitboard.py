@@ -0,0 +1,41 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitboard import BitboardPosition
+from perft import CORPUS, perft
+from position import Position
+
+def test_perft_counts():
+    for name, fen, counts, _ in CORPUS:
+        assert perft(BitboardPosition(fen), 2) == counts[1], name
+
+def test_moves_and_keys_match_the_mailbox_position():
+    rng = random.Random(7)
+    for _, fen, _, _ in CORPUS:
+        bitboard, mailbox = BitboardPosition(fen), Position(fen)
+        for _ in range(40):
+            moves = sorted(mailbox.legal_moves())
+            assert sorted(bitboard.legal_moves()) == moves
+            assert bitboard.key == mailbox.key and bitboard.fen() == mailbox.fen()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            bitboard.make_move(move)
+            mailbox.make_move(move)
+        while mailbox.stack:
+            bitboard.unmake_move()
+            mailbox.unmake_move()
+        assert bitboard.key == mailbox.key and bitboard.fen() == fen and bitboard.repetitions == mailbox.repetitions
+
+def test_repetition():
+    position = BitboardPosition()
+    shuffle = [6 | 21 << 6, 62 | 45 << 6, 21 | 6 << 6, 45 | 62 << 6] # Nf3 Nf6 Ng1 Ng8
+    for move in shuffle * 2:
+        assert not position.is_repetition()
+        position.make_move(move)
+    assert position.is_repetition()
+    position.unmake_move()
+    assert not position.is_repetition()
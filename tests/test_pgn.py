@@ -0,0 +1,41 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pgn import PGNError, read_games, replay
+from position import Position, START_FEN
+
+BAD_FEN_GAME = """[Event "broken"]
+[SetUp "1"]
+[FEN "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1"]
+
+1. e4 e5 *
+
+[Event "fine"]
+
+1. e4 e5 2. Nf3 Nc6 *
+"""
+
+@pytest.mark.parametrize("fen", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1", # bad piece letter
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -", # counters missing
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1", # a rank missing
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQ1BNR w kq - 0 1", # no white king
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1", # side to move
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e4 0 1", # en passant square
+])
+def test_malformed_fen_raises_value_error(fen):
+    position = Position()
+    with pytest.raises(ValueError):
+        position.set_fen(fen)
+    assert position.fen() == START_FEN
+
+def test_bad_fen_tag_fails_only_its_game():
+    games = list(read_games(io.StringIO(BAD_FEN_GAME)))
+    with pytest.raises(PGNError):
+        replay(*games[0][:2])
+    assert len(replay(*games[1][:2])) == 4
@@ -0,0 +1,14 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import movegen
+from position import Position
+
+def test_moves_of_one_square():
+    position = Position()
+    e2, e4, e7 = (movegen.SQUARE_INDEX[name] for name in ("e2", "e4", "e7"))
+    assert sorted(movegen.move_to_uci(move) for move in position.legal_moves(e2)) == ["e2e3", "e2e4"]
+    assert position.legal_moves(e7) == [] # the other side's pawn
+    assert position.legal_moves(e4) == [] # an empty square
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from position import START_FEN
+from state import BoardState
+
+def test_loads_the_start_position_without_python_chess():
+    state = BoardState()
+    assert state.gen_fen() == START_FEN
+    assert state.running
+    assert "chess" not in sys.modules
+
+def test_malformed_fen_raises_value_error():
+    with pytest.raises(ValueError):
+        BoardState("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQ1BNR w KQkq - 0 1")
+    state = BoardState()
+    assert not state.is_valid_position("8/8/8/8/8/8/8/8 w - - 0 1")
+    assert state.is_valid_position(START_FEN)
+
+def test_finished_position_stops_the_game():
+    assert not BoardState("7k/5QQ1/8/8/8/8/8/K7 b - - 0 1").running
@@ -0,0 +1,54 @@
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tournament import MatchStats, player_names, sprt_bounds
+
+def stats(wins, draws, losses):
+    match = MatchStats()
+    for points, count in ((1, wins), (0.5, draws), (0, losses)):
+        for _ in range(count):
+            match.add(points)
+    return match
+
+def test_counts_and_score():
+    match = stats(30, 40, 20)
+    assert (match.wins, match.draws, match.losses, match.games) == (30, 40, 20, 90)
+    assert match.score() == (30 + 20) / 90
+
+def test_elo_of_known_scores():
+    assert stats(5, 0, 5).elo()[0] == 0
+    elo, margin = stats(30, 40, 20).elo()
+    assert math.isclose(elo, -400 * math.log10(90 / 50 - 1))
+    assert 0 < margin < 100
+    assert stats(3, 0, 0).elo() == (math.inf, math.inf)
+    assert stats(0, 0, 3).elo()[0] == -math.inf
+
+def test_los():
+    assert MatchStats().los() == 0.5
+    assert stats(0, 10, 0).los() == 0.5
+    assert math.isclose(stats(1, 0, 0).los(), 0.5 * (1 + math.erf(1 / math.sqrt(2))))
+    assert stats(30, 40, 20).los() > 0.9
+
+def test_llr_signs():
+    assert MatchStats().llr(0, 10) == 0.0
+    assert stats(30, 40, 20).llr(0, 10) > 0 # scoring above both hypotheses favours H1
+    assert stats(20, 40, 30).llr(0, 10) < 0
+
+def test_llr_when_every_game_had_the_same_result():
+    for match in (stats(0, 1, 0), stats(0, 7, 0), stats(4, 0, 0), stats(0, 0, 4)):
+        llr = match.llr(0, 10)
+        assert math.isfinite(llr)
+    assert stats(0, 7, 0).llr(0, 10) < 0 # all draws sit closer to elo0
+    assert stats(4, 0, 0).llr(0, 10) > 0
+
+def test_sprt_bounds():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert math.isclose(lower, math.log(0.05 / 0.95))
+    assert math.isclose(upper, -lower)
+
+def test_player_names_are_unique_in_self_play():
+    assert player_names(["search", "random"]) == ["search", "random"]
+    assert player_names(["search", "search", "random"]) == ["search #1", "search #2", "random"]
@@ -0,0 +1,438 @@
+# Headless engine matches: games between configurable players run concurrently on a process pool (no window,
+# no pygame), each worker keeps its engines warm between games. Games are written as PGN as they finish and
+# the score of every pairing is reported with its Elo difference, LOS and, for two players, an SPRT.
+#
+#   python tournament.py --players "search:movetime=0.1" random --games 20
+#   python tournament.py --players "stockfish:depth=8" "stockfish:depth=4" --tc 10+0.1 --openings openings.epd
+#   python tournament.py --players "search:tt=1048576" search --tc 5+0.05 --sprt 0 10 --games 2000 --pgn match.pgn
+#
+# Players: "search" (the built-in engine, options depth, movetime, nodes, tt), "stockfish" or "uci:cmd=<engine>"
+# (options depth, movetime, nodes, anything else is set as a UCI option, e.g. Hash=64) and "random".
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import engine
+import history
+import movegen
+import pgn
+import search
+from position import Position, START_FEN
+
+class RandomMover():
+    """Plays a random legal move"""
+    def __init__(self) -> None:
+        self.rng = random.Random()
+
+    def new_game(self, seed):
+        self.rng.seed(seed)
+
+    def move(self, position, start_fen, moves, clocks):
+        return self.rng.choice(position.legal_moves())
+
+class SearchMover():
+    """The built-in engine (search.py)
+
+    Args:
+        depth (int, optional): depth limit. Defaults to 64.
+        movetime (float, optional): seconds per move, with a time control the clock may allow less. Defaults to None.
+        nodes (int, optional): node limit per move. Defaults to None.
+        tt (int, optional): transposition table slots. Defaults to 2 ** 18.
+    """
+    def __init__(self, depth=64, movetime=None, nodes=None, tt=2 ** 18) -> None:
+        self.searcher = search.Searcher(tt_size=tt)
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+
+    def new_game(self, seed):
+        self.searcher.tt.clear()
+
+    def move(self, position, start_fen, moves, clocks):
+        movetime = self.movetime
+        if clocks is not None:
+            budget = clocks[position.turn] / 30 + clocks["inc"] * 0.8 # a share of the remaining time plus most of the increment
+            movetime = min(movetime, budget) if movetime else budget
+        elif movetime is None and self.depth == 64 and self.nodes is None:
+            movetime = 0.1 # nothing would stop the search otherwise
+        return self.searcher.search(position, depth=self.depth, movetime=movetime, nodes=self.nodes)["move"]
+
+class UCIMover():
+    """A UCI engine process, reused for every game the worker plays
+
+    Args:
+        cmd (str, optional): engine executable. Defaults to the bundled Stockfish path.
+        depth (int, optional): depth limit. Defaults to None.
+        movetime (float, optional): seconds per move. Defaults to None.
+        nodes (int, optional): node limit per move. Defaults to None.
+        options: UCI options (Hash, Threads, Skill Level, ...)
+    """
+    def __init__(self, cmd=engine.STOCKFISH_PATH, depth=None, movetime=None, nodes=None, **options) -> None:
+        self.pool = engine.EnginePool(cmd, size=1, options=options)
+        with self.pool.engine(): # started right away so an engine that can't run stops the match instead of losing every game
+            pass
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+
+    def new_game(self, seed):
+        self.pool.new_game()
+
+    def move(self, position, start_fen, moves, clocks):
+        import chess
+        import chess.engine
+
+        board = chess.Board(start_fen) # replayed so the engine knows the game's repetitions
+        for move in moves:
+            board.push(chess.Move.from_uci(movegen.move_to_uci(move)))
+        limit = chess.engine.Limit(depth=self.depth, time=self.movetime, nodes=self.nodes)
+        if clocks is not None:
+            limit.white_clock, limit.black_clock = clocks["w"], clocks["b"]
+            limit.white_inc = limit.black_inc = clocks["inc"]
+        elif self.depth is None and self.movetime is None and self.nodes is None:
+            limit.time = 0.1
+        with self.pool.engine() as uci:
+            played = uci.play(board, limit, game=self.pool.game).move
+        return movegen.uci_to_move(played.uci()) if played is not None else None
+
+    def close(self):
+        self.pool.close()
+
+def _value(text : str):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def parse_player(spec : str):
+    """Reads a player spec ("kind:key=value,key=value")
+
+    Returns:
+        tuple: (kind, options dict)
+    """
+    kind, _, rest = spec.partition(":")
+    options = {}
+    for item in filter(None, rest.split(",")):
+        key, _, value = item.partition("=")
+        options[key.strip()] = _value(value.strip())
+    if kind not in ("search", "stockfish", "uci", "random"):
+        raise ValueError(f"unknown player {kind!r} (search, stockfish, uci or random)")
+    if kind == "uci" and "cmd" not in options:
+        raise ValueError("uci players need cmd=<engine executable>")
+    return kind, options
+
+def create_mover(spec : str):
+    kind, options = parse_player(spec)
+    if kind == "search":
+        return SearchMover(**options)
+    if kind == "random":
+        return RandomMover()
+    return UCIMover(**options)
+
+_movers = {} # player name -> mover, per worker process so engines stay warm between games
+
+def _mover(name : str, spec : str):
+    if name not in _movers:
+        _movers[name] = create_mover(spec)
+    return _movers[name]
+
+def player_names(specs : list):
+    """Unique names of the players, a spec given more than once (self play) is numbered ("search #1", "search #2")"""
+    return [spec if specs.count(spec) == 1 else f"{spec} #{specs[:number].count(spec) + 1}" for number, spec in enumerate(specs)]
+
+def parse_time_control(text : str):
+    """"base+increment" in seconds ("10+0.1", "60") to (base, increment), None for no clock"""
+    if not text:
+        return None
+    base, _, increment = text.partition("+")
+    return float(base), float(increment or 0)
+
+def read_openings(path : str):
+    """Start positions from a FEN or EPD file (one per line, EPD operations are ignored)
+
+    Returns:
+        list: FEN strings
+    """
+    openings = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split(";")[0].split()
+            if len(fields) < 4 or line.startswith("#"):
+                continue
+            counters = fields[4:6] if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit() else ["0", "1"]
+            openings.append(" ".join(fields[:4] + counters))
+    return openings
+
+def _insufficient_material(squares):
+    """Only kings, or kings and a single knight or bishop"""
+    others = [code for code in squares if code is not None and code not in "Kk"]
+    return not others or (len(others) == 1 and others[0] in "NBnb")
+
+def termination(position):
+    """How the game ended in this position
+
+    Returns:
+        tuple or None: (result, reason), None if the game goes on
+    """
+    if not position.legal_moves():
+        if position.is_check():
+            return ("0-1" if position.turn == "w" else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if position.is_repetition():
+        return "1/2-1/2", "threefold repetition"
+    if position.half_moves >= 100:
+        return "1/2-1/2", "fifty move rule"
+    if _insufficient_material(position.squares):
+        return "1/2-1/2", "insufficient material"
+    return None
+
+def play_game(index : int, white : str, black : str, fen : str, time_control=None, max_plies=400, seed=None, specs=None):
+    """Plays one game (runs in a worker process)
+
+    Args:
+        index (int): game number
+        white (str): player name of white
+        black (str): player name of black
+        fen (str): start position
+        time_control (tuple, optional): (base, increment) in seconds, a player whose clock runs out loses. Defaults to None.
+        max_plies (int, optional): the game is adjudicated a draw after this many moves. Defaults to 400.
+        seed (int, optional): seed of the random players. Defaults to None.
+        specs (dict, optional): player name -> spec, each name gets its own mover. Defaults to None (the names are the specs).
+
+    Returns:
+        dict: index, white, black, fen, moves (movegen encoded), result, termination and the time taken
+    """
+    start = time.perf_counter()
+    specs = specs or {}
+    movers = {"w" : _mover(white, specs.get(white, white)), "b" : _mover(black, specs.get(black, black))}
+    for mover in movers.values():
+        mover.new_game(seed)
+    position = Position(fen)
+    moves = []
+    clocks = {"w" : time_control[0], "b" : time_control[0], "inc" : time_control[1]} if time_control else None
+    loses = lambda color: "0-1" if color == "w" else "1-0"
+
+    while True:
+        ended = termination(position)
+        if ended is None and len(moves) >= max_plies:
+            ended = "1/2-1/2", "adjudication (move limit)"
+        if ended is not None:
+            break
+
+        turn = position.turn
+        moved = time.perf_counter()
+        try:
+            move = movers[turn].move(position, fen, moves, clocks)
+        except Exception as e:
+            ended = loses(turn), f"engine error ({e or type(e).__name__})"
+            break
+        if clocks is not None:
+            clocks[turn] -= time.perf_counter() - moved
+            if clocks[turn] < 0:
+                ended = loses(turn), "time forfeit"
+                break
+            clocks[turn] += clocks["inc"]
+        if move is None or move not in position.legal_moves(move & 63):
+            ended = loses(turn), f"illegal move {movegen.move_to_uci(move) if move is not None else '(none)'}"
+            break
+        position.make_move(move)
+        moves.append(move)
+
+    return {"index" : index, "white" : white, "black" : black, "fen" : fen, "moves" : moves,
+            "result" : ended[0], "termination" : ended[1], "time" : time.perf_counter() - start}
+
+class MatchStats():
+    """Score of a pairing from the first player's view"""
+    def __init__(self) -> None:
+        self.wins = self.draws = self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, points : float):
+        if points == 1:
+            self.wins += 1
+        elif points == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.5
+
+    def variance(self):
+        """Variance of a single game's points"""
+        score = self.score()
+        return (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / self.games if self.games else 0.0
+
+    def elo(self):
+        """Elo difference and its 95% error margin (infinite while one side scored everything)"""
+        score = self.score()
+        if score <= 0 or score >= 1:
+            return math.copysign(math.inf, score - 0.5), math.inf
+        margin = 1.96 * math.sqrt(self.variance() / self.games)
+        low, high = max(score - margin, 1e-9), min(score + margin, 1 - 1e-9)
+        return _elo(score), (_elo(high) - _elo(low)) / 2
+
+    def los(self):
+        """Likelihood of superiority: the chance the first player is the stronger one, from wins and losses"""
+        decisive = self.wins + self.losses
+        return 0.5 * (1 + math.erf((self.wins - self.losses) / math.sqrt(2 * decisive))) if decisive else 0.5
+
+    def llr(self, elo0 : float, elo1 : float):
+        """Log likelihood ratio of H1 (the Elo difference is elo1) against H0 (it's elo0), normal approximation
+        of the trinomial GSPRT"""
+        if not self.games:
+            return 0.0
+        stats = self
+        if not self.variance(): # every game had the same result, a virtual win and loss keep the variance above zero
+            stats = MatchStats()
+            stats.wins, stats.draws, stats.losses = self.wins + 1, self.draws, self.losses + 1
+        score0, score1 = _expected(elo0), _expected(elo1)
+        return self.games * (score1 - score0) * (2 * stats.score() - score0 - score1) / (2 * stats.variance())
+
+    def __str__(self):
+        elo, margin = self.elo()
+        return f"+{self.wins} ={self.draws} -{self.losses}, Elo {elo:+.0f} ± {margin:.0f}, LOS {self.los():.1%}"
+
+def _expected(elo : float):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def _elo(score : float):
+    return -400 * math.log10(1 / score - 1)
+
+def sprt_bounds(alpha : float, beta : float):
+    """LLR bounds: H0 is accepted below the lower one, H1 above the upper one"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def schedule(players : list, games : int, openings : list):
+    """Every pairing plays `games` games, each opening twice with the colors swapped
+
+    Yields:
+        tuple: (pairing, white, black, fen)
+    """
+    pairings = [(first, second) for i, first in enumerate(players) for second in players[i + 1:]]
+    for game in range(games):
+        fen = openings[(game // 2) % len(openings)]
+        for first, second in pairings:
+            yield (first, second), *((first, second) if game % 2 == 0 else (second, first)), fen
+
+def game_pgn(result : dict, time_control=None):
+    line = history.GameHistory(result["fen"])
+    for move in result["moves"]:
+        line.append(move)
+    headers = {"Event" : "Engine match", "Site" : "Chess Interface", "Date" : time.strftime("%Y.%m.%d"),
+               "Round" : str(result["index"] + 1), "White" : result["white"], "Black" : result["black"],
+               "Result" : result["result"], "Termination" : result["termination"]}
+    if time_control is not None:
+        headers["TimeControl"] = f"{time_control[0]:g}+{time_control[1]:g}"
+    return pgn.format_game(headers, line, result["result"])
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play engine matches on a process pool and report Elo/SPRT statistics")
+    parser.add_argument("--players", nargs="+", required=True, help='player specs, e.g. "search:movetime=0.1" "stockfish:depth=8" random')
+    parser.add_argument("--games", type=int, default=10, help="games per pairing")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="games played at once")
+    parser.add_argument("--tc", help='time control "base+increment" in seconds, e.g. 10+0.1 (no clock by default)')
+    parser.add_argument("--openings", help="FEN or EPD file of start positions, each is played with both colors")
+    parser.add_argument("--pgn", help="append the games to this PGN file")
+    parser.add_argument("--max-plies", type=int, default=400, help="adjudicate a draw after this many moves")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="stop once an SPRT between two players decides")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random players")
+    args = parser.parse_args(argv)
+
+    if len(args.players) < 2:
+        parser.error("at least two players are needed")
+    if args.sprt and len(args.players) != 2:
+        parser.error("--sprt needs exactly two players")
+    try:
+        for spec in args.players:
+            parse_player(spec)
+    except ValueError as e:
+        parser.error(str(e))
+    time_control = parse_time_control(args.tc)
+    openings = read_openings(args.openings) if args.openings else [START_FEN]
+    if not openings:
+        parser.error(f"no positions in {args.openings}")
+
+    stats = {}
+    total = args.games * len(args.players) * (len(args.players) - 1) // 2
+    bounds = sprt_bounds(args.alpha, args.beta) if args.sprt else None
+    output = open(args.pgn, "a") if args.pgn else None
+    names = player_names(args.players)
+    specs = dict(zip(names, args.players))
+    jobs = enumerate(schedule(names, args.games, openings))
+    pending = {} # future -> pairing
+    finished = 0
+    decision = error = None
+    start = time.perf_counter()
+
+    executor = ProcessPoolExecutor(args.concurrency)
+    try:
+        while True:
+            while decision is None and error is None and len(pending) < args.concurrency * 2:
+                try:
+                    index, (pairing, white, black, fen) = next(jobs)
+                except StopIteration:
+                    break
+                future = executor.submit(play_game, index, white, black, fen, time_control, args.max_plies, args.seed * 1000003 + index, specs)
+                pending[future] = pairing
+            if not pending:
+                break
+
+            ready, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in ready:
+                pairing = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e: # a player that can't start (e.g. a missing engine) fails every game, so stop
+                    error = error or f"{pairing[0]} vs {pairing[1]}: {e or type(e).__name__}"
+                    continue
+                finished += 1
+                points = {"1-0" : 1, "0-1" : 0}.get(result["result"], 0.5)
+                stats.setdefault(pairing, MatchStats()).add(points if result["white"] == pairing[0] else 1 - points)
+                if output is not None:
+                    output.write(game_pgn(result, time_control))
+                    output.flush()
+
+                line = f"{finished}/{total} {result['white']} - {result['black']} {result['result']} ({result['termination']}) | {stats[pairing]}"
+                if bounds is not None:
+                    llr = stats[pairing].llr(*args.sprt)
+                    line += f", LLR {llr:.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]"
+                    if decision is None and llr <= bounds[0]:
+                        decision = "H0 accepted"
+                    elif decision is None and llr >= bounds[1]:
+                        decision = "H1 accepted"
+                print(line)
+            if decision is not None or error is not None:
+                break
+    except KeyboardInterrupt:
+        print("interrupted")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if output is not None:
+            output.close()
+
+    seconds = time.perf_counter() - start
+    print(f"\n{finished} games in {seconds:.1f}s ({finished / seconds if seconds else 0:.2f} games/s)")
+    for (first, second), pairing in stats.items():
+        print(f"{first} vs {second}: {pairing}")
+    if decision is not None:
+        print(f"SPRT({args.sprt[0]:g}, {args.sprt[1]:g}): {decision}")
+    if error is not None:
+        print(f"stopped, a game failed: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
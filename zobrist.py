@@ -0,0 +1,42 @@
+# Zobrist hashing: every (piece, square), castling right, en passant file and the side to move gets a random
+# 64 bit number and a position's key is the XOR of the numbers of everything in it. Making a move only has to
+# XOR out what changed and XOR in the new state, so the key is kept up to date in O(1).
+import random
+
+import movegen
+
+_random = random.Random(0x5EED) # fixed seed so keys are stable between runs (caches on disk rely on it)
+
+PIECE_KEYS = {code : [_random.getrandbits(64) for _ in range(64)] for code in "PNBRQKpnbrqk"}
+CASTLING_KEYS = {right : _random.getrandbits(64) for right in "KQkq"}
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+BLACK_TO_MOVE = _random.getrandbits(64)
+
+def castling_key(castling : str):
+    key = 0
+    for right in castling:
+        key ^= CASTLING_KEYS.get(right, 0)
+    return key
+
+def en_passant_key(squares, en_passant, turn : str):
+    """En passant only counts when a pawn of the side to move could actually capture,
+    otherwise identical positions would hash differently after a double step"""
+    if en_passant is None:
+        return 0
+    pawn = "P" if turn == "w" else "p"
+    for source in movegen.PAWN_ATTACKS["b" if turn == "w" else "w"][en_passant]:
+        if squares[source] == pawn:
+            return EN_PASSANT_KEYS[en_passant % 8]
+    return 0
+
+def hash_position(squares, turn : str, castling : str, en_passant):
+    """Computes a position's key from scratch"""
+    key = 0
+    for square, code in enumerate(squares):
+        if code is not None:
+            key ^= PIECE_KEYS[code][square]
+    key ^= castling_key(castling)
+    key ^= en_passant_key(squares, en_passant, turn)
+    if turn == "b":
+        key ^= BLACK_TO_MOVE
+    return key